@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+bench_intel_ingest.py
+
+Offline benchmark for the threat feed ingest script. Generates synthetic feeds at a configurable
+scale (NVD 1.1 gzip, ATT&CK STIX 2.1 zip, CISA RSS, paginated MSRC OData), serves them from a
+local HTTP stand-in with optional latency and 429 throttling, and times the ingest stages against
+it. Each stage runs in a fresh process, so the reported peak RSS belongs to that stage alone.
+
+Reports seconds, records/sec, bytes/sec and peak RSS per stage; --json writes the same results
+for tracking in CI.
+
+Requirements:
+  The ingest script's own requirements (requests tqdm feedparser)
+
+Usage:
+  python3 bench_intel_ingest.py --cves 50000 --techniques 2000 --json bench.json
+  python3 bench_intel_ingest.py --script daily_intel_ingest_v2.py --latency_ms 50 --throttle_every 5
+"""
+
+import io
+import os
+import ast
+import sys
+import json
+import gzip
+import time
+import types
+import random
+import zipfile
+import argparse
+import tempfile
+import threading
+import hashlib
+import inspect
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_intel_ingest.py")
+STAGES = ["fetch_url", "parse_nvd_json", "parse_mitre_stix", "parse_cisa_rss", "parse_msrc_api", "main", "store_query"]
+# Dashboard requests timed by the store_query stage against a store holding the NVD feed: (label, endpoint,
+# page, size, q). Pages past the end of the data return nothing but are timed all the same.
+STORE_QUERIES = [
+    ("page 1", "/nvd", 1, 20, None),
+    ("page 5000", "/nvd", 5000, 20, None),
+    ("q=kernel", "/nvd", 1, 20, "kernel"),
+    ("q=kernel page 400", "/nvd", 400, 20, "kernel"),
+    ("q=3 terms", "/nvd", 1, 20, "remote kernel overflow"),
+    ("q=3 terms page 100", "/nvd", 100, 20, "remote kernel overflow"),
+    ("q=cve id", "/nvd", 1, 20, "CVE-2024-10017"),
+]
+
+WORDS = ("remote attacker execute arbitrary code crafted request buffer overflow kernel driver "
+         "privilege escalation authentication bypass memory corruption improper validation input "
+         "network adjacent local user heap use-after-free denial service information disclosure "
+         "spoofing web application component server client protocol handler").split()
+VENDORS = [("microsoft", ["windows_10", "windows_server_2019", "office", "exchange_server", "edge"]),
+           ("apache", ["http_server", "tomcat", "struts"]),
+           ("cisco", ["ios_xe", "asa", "webex"]),
+           ("linux", ["linux_kernel"]),
+           ("oracle", ["weblogic_server", "java_se"])]
+TACTICS = ["initial-access", "execution", "persistence", "privilege-escalation", "defense-evasion",
+           "credential-access", "discovery", "lateral-movement", "collection", "exfiltration", "impact"]
+PLATFORMS = ["Windows", "Linux", "macOS", "Network", "Containers", "IaaS"]
+
+
+def load_ingest(path):
+    """
+    Loads the ingest script as a module. Accepts either the plain script or the manifest that
+    carries it in "script_content" (as daily_intel_ingest.py does).
+    """
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    try:
+        source = ast.literal_eval(source)["script_content"]
+    except (ValueError, SyntaxError, KeyError, TypeError):
+        pass # A plain script
+    module = types.ModuleType("daily_intel_ingest")
+    module.__file__ = path
+    exec(compile(source, path, "exec"), module.__dict__)
+    return module
+
+
+def _text(rng, n_words):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def generate_nvd_gz(n_items, seed=0):
+    """NVD 1.1 JSON feed with n_items CVE_Items, gzip-compressed."""
+    rng = random.Random(seed)
+    items = []
+    for i in range(n_items):
+        cve_id = f"CVE-{2002 + i % 23}-{10000 + i}"
+        vendor, products = rng.choice(VENDORS)
+        score = round(rng.uniform(1.0, 10.0), 1)
+        impact = {"baseMetricV2": {"cvssV2": {"version": "2.0", "vectorString": "AV:N/AC:L/Au:N/C:P/I:P/A:P",
+                                              "baseScore": round(score * 0.9, 1)},
+                                   "severity": "HIGH" if score >= 7 else "MEDIUM"}}
+        if rng.random() < 0.8:
+            impact["baseMetricV3"] = {"cvssV3": {"version": "3.1", "vectorString": "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H",
+                                                 "baseScore": score,
+                                                 "baseSeverity": "CRITICAL" if score >= 9 else "HIGH" if score >= 7 else "MEDIUM"}}
+        references = [{"url": f"https://{vendor}.example.com/advisories/{i}", "name": f"ADV-{i}", "refsource": "CONFIRM", "tags": []}
+                      for _ in range(rng.randint(1, 4))]
+        if rng.random() < 0.1:
+            references.append({"url": f"https://nvd.nist.gov/vuln/detail/CVE-{2002 + i % 23}-{10000 + rng.randrange(n_items)}",
+                               "name": "related", "refsource": "MISC", "tags": []})
+        items.append({
+            "cve": {
+                "data_type": "CVE", "data_format": "MITRE", "data_version": "4.0",
+                "CVE_data_meta": {"ID": cve_id, "ASSIGNER": "cve@mitre.org"},
+                "problemtype": {"problemtype_data": [{"description": [{"lang": "en", "value": "CWE-787"}]}]},
+                "references": {"reference_data": references},
+                "description": {"description_data": [{"lang": "en", "value": _text(rng, rng.randint(15, 60))}]},
+            },
+            "configurations": {"CVE_data_version": "4.0", "nodes": [{"operator": "OR", "children": [], "cpe_match": [
+                {"vulnerable": True, "cpe23Uri": f"cpe:2.3:a:{vendor}:{rng.choice(products)}:{rng.randint(1, 20)}.{rng.randint(0, 9)}:*:*:*:*:*:*:*",
+                 "cpe_name": []} for _ in range(rng.randint(1, 3))]}]},
+            "impact": impact,
+            "publishedDate": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}T10:15Z",
+            "lastModifiedDate": f"2024-{1 + i % 12:02d}-{1 + (i + 3) % 28:02d}T08:00Z",
+        })
+    feed = {"CVE_data_type": "CVE", "CVE_data_format": "MITRE", "CVE_data_version": "4.0",
+            "CVE_data_numberOfCVEs": str(n_items), "CVE_data_timestamp": "2024-06-01T00:00Z", "CVE_Items": items}
+    return gzip.compress(json.dumps(feed).encode("utf-8"))
+
+
+def generate_stix_zip(n_techniques, seed=0, framework="mitre-attack"):
+    """STIX 2.1 bundle with n_techniques attack-patterns plus mitigations, groups, software and relationships, zipped."""
+    rng = random.Random(seed)
+    objects = [{"type": "identity", "id": "identity--c78cb6e5-0c4b-4611-8297-d1b8b55e40b5", "name": "The MITRE Corporation",
+                "identity_class": "organization", "spec_version": "2.1"},
+               {"type": "marking-definition", "id": "marking-definition--fa42a846-8d90-4e51-bc29-71d5b4802168",
+                "definition_type": "statement", "definition": {"statement": "Copyright MITRE"}}]
+    n_side = max(1, n_techniques // 4)
+    for kind, prefix, stix_type in (("M", "course-of-action", "course-of-action"), ("G", "intrusion-set", "intrusion-set"),
+                                    ("S", "malware", "malware")):
+        for i in range(n_side):
+            objects.append({"type": stix_type, "id": f"{prefix}--{kind}{i:06d}", "name": f"{kind}{i} {_text(rng, 2)}",
+                            "description": _text(rng, 40), "spec_version": "2.1",
+                            "external_references": [{"source_name": framework, "external_id": f"{kind}{1000 + i}"}]})
+    for i in range(n_techniques):
+        stix_id = f"attack-pattern--{i:08d}-0000-4000-8000-000000000000"
+        objects.append({
+            "type": "attack-pattern", "id": stix_id, "spec_version": "2.1",
+            "name": f"Technique {i} {_text(rng, 3)}",
+            "description": _text(rng, rng.randint(60, 250)),
+            "external_references": [{"source_name": framework, "external_id": f"T{1000 + i}",
+                                     "url": f"https://attack.mitre.org/techniques/T{1000 + i}"}],
+            "kill_chain_phases": [{"kill_chain_name": framework, "phase_name": p} for p in rng.sample(TACTICS, rng.randint(1, 2))],
+            "x_mitre_platforms": rng.sample(PLATFORMS, rng.randint(1, 3)),
+            "x_mitre_data_sources": ["Process: Process Creation", "Command: Command Execution"],
+            "x_mitre_detection": _text(rng, 40),
+            "created": "2020-01-01T00:00:00.000Z", "modified": f"2024-{1 + i % 12:02d}-01T00:00:00.000Z",
+        })
+        for _ in range(rng.randint(2, 6)):
+            kind, prefix = rng.choice((("M", "course-of-action"), ("G", "intrusion-set"), ("S", "malware")))
+            objects.append({"type": "relationship", "id": f"relationship--{len(objects):012d}", "spec_version": "2.1",
+                            "relationship_type": "mitigates" if kind == "M" else "uses",
+                            "source_ref": f"{prefix}--{kind}{rng.randrange(n_side):06d}", "target_ref": stix_id,
+                            "description": _text(rng, 20)})
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("enterprise-attack.json", json.dumps({"type": "bundle", "id": "bundle--0", "objects": objects}))
+    return buf.getvalue()
+
+
+def generate_cisa_rss(n_items, seed=0, kind="alerts"):
+    """CISA-style RSS 2.0 feed with n_items entries, some naming CVEs."""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(n_items):
+        cves = " ".join(f"CVE-2024-{10000 + rng.randrange(50000)}" for _ in range(rng.randint(0, 3)))
+        entries.append(
+            f"<item><title>CISA {kind} {i}: {_text(rng, 6)}</title>"
+            f"<link>https://www.cisa.gov/news-events/{kind}/{2024}/{i}</link>"
+            f"<pubDate>Mon, {1 + i % 28:02d} Apr 2024 12:00:00 GMT</pubDate>"
+            f"<description>&lt;p&gt;{_text(rng, 80)} {cves}&lt;/p&gt;</description></item>")
+    return ('<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel><title>CISA</title>'
+            '<link>https://www.cisa.gov</link><description>CISA feed</description>'
+            + "".join(entries) + "</channel></rss>").encode("utf-8")
+
+
+def generate_msrc_page(page, n_pages, per_page, base_url, seed=0):
+    """One MSRC OData page of per_page vulnerabilities, with @odata.nextLink unless it is the last."""
+    rng = random.Random(seed * 100003 + page)
+    values = []
+    for i in range(per_page):
+        n = page * per_page + i
+        values.append({
+            "cveNumber": f"CVE-2024-{20000 + n}",
+            "releaseDate": "2024-04-09T07:00:00Z",
+            "vulnerabilityName": f"Windows {_text(rng, 3)} Vulnerability",
+            "description": {"value": _text(rng, 50)},
+            "cvssScoreSets": [{"baseScore": round(rng.uniform(4, 10), 1), "severity": "Important",
+                               "vector": "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H"}],
+            "affectedProducts": [{"productFamily": "Windows", "productName": f"Windows {rng.choice(['10', '11', 'Server 2022'])} for x64-based Systems"}
+                                 for _ in range(rng.randint(1, 6))],
+            "exploited": rng.choice(["Yes", "No", "No", "No"]),
+            "publiclyDisclosed": rng.choice(["Yes", "No", "No"]),
+        })
+    data = {"@odata.context": f"{base_url}/$metadata", "value": values}
+    if page + 1 < n_pages:
+        data["@odata.nextLink"] = f"{base_url}?page={page + 1}"
+    return json.dumps(data).encode("utf-8")
+
+
+class FeedServer:
+    """
+    Local HTTP stand-in for the feed hosts. Serves the generated payloads with ETags (so 304s and the
+    HTTP cache can be exercised), adds 'latency' seconds to every response and, if throttle_every is
+    set, answers every Nth MSRC request with 429 and Retry-After: 0.
+    """
+
+    def __init__(self, payloads, msrc_pages, msrc_per_page, latency=0.0, throttle_every=0, seed=0):
+        self.payloads = payloads
+        self.msrc_pages = msrc_pages
+        self.msrc_per_page = msrc_per_page
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.seed = seed
+        self._msrc_requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="feed-server", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def urls(self):
+        return {
+            "NVD_RECENT_URL": f"{self.base_url}/nvd/nvdcve-1.1-recent.json.gz",
+            "MITRE_ENTERPRISE_URL": f"{self.base_url}/mitre/enterprise.zip",
+            "MITRE_ICS_URL": f"{self.base_url}/mitre/ics.zip",
+            "CISA_ALERTS_URL": f"{self.base_url}/cisa/alerts.xml",
+            "CISA_ACTIVITY_URL": f"{self.base_url}/cisa/current-activity.xml",
+            "MSRC_API_URL": f"{self.base_url}/msrc/vulnerabilities",
+        }
+
+    def _send(self, handler, status, body=b"", headers=None):
+        handler.send_response(status)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _handle(self, handler):
+        if self.latency:
+            time.sleep(self.latency)
+        path, _, query = handler.path.partition("?")
+        if path == "/msrc/vulnerabilities":
+            with self._lock:
+                self._msrc_requests += 1
+                throttled = self.throttle_every and self._msrc_requests % self.throttle_every == 0
+            if throttled:
+                self._send(handler, 429, headers={"Retry-After": "0"})
+                return
+            page = int(query.split("page=", 1)[1]) if "page=" in query else 0
+            body = generate_msrc_page(page, self.msrc_pages, self.msrc_per_page, f"{self.base_url}/msrc/vulnerabilities", self.seed)
+            self._send(handler, 200, body, {"Content-Type": "application/json"})
+            return
+        body = self.payloads.get(path)
+        if body is None:
+            self._send(handler, 404)
+            return
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if handler.headers.get("If-None-Match") == etag:
+            self._send(handler, 304, headers={"ETag": etag})
+            return
+        self._send(handler, 200, body, {"ETag": etag, "Last-Modified": "Mon, 01 Apr 2024 00:00:00 GMT"})
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KiB elsewhere
+
+
+def _count_lines(paths):
+    total = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            total += sum(1 for _ in f)
+    return total
+
+
+def _run_stage(script_path, stage, urls, payload_sizes, stix_path, workdir):
+    """Runs one stage in this (fresh) process and returns its measurements."""
+    ingest = load_ingest(script_path)
+    ingest.logger.setLevel("WARNING")
+    # The parse stages read SHOW_PROGRESS; main() resets it from its progress argument
+    ingest.SHOW_PROGRESS = False
+    for name, url in urls.items():
+        setattr(ingest, name, url)
+    out_dir = tempfile.mkdtemp(prefix=f"{stage}_", dir=workdir)
+    out_path = os.path.join(out_dir, f"{stage}.jsonl")
+
+    started = time.perf_counter()
+    if stage == "fetch_url":
+        data = ingest.fetch_url(urls["NVD_RECENT_URL"], decompress_gzip=True)
+        records = len(data["CVE_Items"]) if data else 0
+        nbytes = payload_sizes["nvd"]
+    elif stage == "parse_nvd_json":
+        records = ingest.parse_nvd_json(ingest.fetch_json_items(urls["NVD_RECENT_URL"], "CVE_Items", decompress_gzip=True), out_path)
+        nbytes = payload_sizes["nvd"]
+    elif stage == "parse_mitre_stix":
+        records = ingest.parse_mitre_stix(stix_path, out_path, "enterprise")
+        nbytes = payload_sizes["stix"]
+    elif stage == "parse_cisa_rss":
+        records = ingest.parse_cisa_rss(urls["CISA_ALERTS_URL"], out_path, "CISA_ALERT")
+        nbytes = payload_sizes["cisa"]
+    elif stage == "parse_msrc_api":
+        records = ingest.parse_msrc_api(out_path, lookback_days=1)
+        nbytes = payload_sizes["msrc"]
+    elif stage == "store_query":
+        # Only the queries are timed; parsing and loading the store happen first
+        ingest.parse_nvd_json(ingest.fetch_json_items(urls["NVD_RECENT_URL"], "CVE_Items", decompress_gzip=True), out_path)
+        queries = {}
+        query_seconds = 0.0
+        if hasattr(ingest, "IntelStore"):
+            store = ingest.IntelStore(os.path.join(out_dir, "intel.sqlite"))
+            try:
+                store.load_jsonl("nvd", out_path)
+                for label, endpoint, page, size, q in STORE_QUERIES:
+                    query_started = time.perf_counter()
+                    store.query(endpoint, page, size, q=q)
+                    elapsed = time.perf_counter() - query_started
+                    queries[label] = round(elapsed * 1000, 2)
+                    query_seconds += elapsed
+            finally:
+                store.close()
+        records = len(queries)
+        nbytes = 0
+    elif stage == "main":
+        if "progress" in inspect.signature(ingest.main).parameters:
+            ingest.main(out_dir, 1, progress=False)
+        else:
+            ingest.main(out_dir, 1)
+        records = _count_lines(os.path.join(out_dir, f) for f in os.listdir(out_dir) if f.endswith(".jsonl"))
+        nbytes = sum(payload_sizes.values())
+    else:
+        raise ValueError(f"Unknown stage {stage}")
+    seconds = query_seconds if stage == "store_query" else time.perf_counter() - started
+
+    records = records or 0
+    result = {
+        "stage": stage,
+        "seconds": round(seconds, 4),
+        "records": records,
+        "records_per_sec": round(records / seconds, 1) if seconds else None,
+        "bytes": nbytes,
+        "bytes_per_sec": round(nbytes / seconds, 1) if seconds else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+    if stage == "store_query":
+        result["query_ms"] = queries
+    return result
+
+
+def run_benchmark(args):
+    started = time.perf_counter()
+    nvd_gz = generate_nvd_gz(args.cves, args.seed)
+    stix_zip = generate_stix_zip(args.techniques, args.seed)
+    ics_zip = generate_stix_zip(max(1, args.techniques // 10), args.seed + 1, framework="mitre-ics-attack")
+    alerts = generate_cisa_rss(args.rss_items, args.seed, "alerts")
+    activity = generate_cisa_rss(args.rss_items, args.seed + 1, "activity")
+    msrc_bytes = sum(len(generate_msrc_page(page, args.msrc_pages, args.msrc_per_page, "", args.seed))
+                     for page in range(args.msrc_pages))
+    print(f"Generated payloads in {time.perf_counter() - started:.1f}s: NVD {len(nvd_gz) / 1e6:.1f} MB gz, "
+          f"STIX {len(stix_zip) / 1e6:.1f} MB zip, MSRC {msrc_bytes / 1e6:.1f} MB over {args.msrc_pages} pages", file=sys.stderr)
+
+    payloads = {
+        "/nvd/nvdcve-1.1-recent.json.gz": nvd_gz,
+        "/mitre/enterprise.zip": stix_zip,
+        "/mitre/ics.zip": ics_zip,
+        "/cisa/alerts.xml": alerts,
+        "/cisa/current-activity.xml": activity,
+    }
+    payload_sizes = {"nvd": len(nvd_gz), "stix": len(stix_zip), "ics": len(ics_zip), "cisa": len(alerts),
+                     "cisa_activity": len(activity), "msrc": msrc_bytes}
+    stages = args.stages or STAGES
+    results = []
+    with tempfile.TemporaryDirectory(prefix="intel_bench_") as workdir, \
+            FeedServer(payloads, args.msrc_pages, args.msrc_per_page, latency=args.latency_ms / 1000.0,
+                       throttle_every=args.throttle_every, seed=args.seed) as server:
+        stix_path = os.path.join(workdir, "enterprise.zip")
+        with open(stix_path, "wb") as f:
+            f.write(stix_zip)
+        for stage in stages:
+            for _ in range(args.repeat):
+                # A fresh interpreter per run keeps peak RSS per stage and avoids warm caches between stages
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    result = pool.submit(_run_stage, args.script, stage, server.urls(), payload_sizes,
+                                         stix_path, workdir).result()
+                results.append(result)
+                print(f"{result['stage']:<18} {result['seconds']:>9.3f}s {result['records']:>9} rec "
+                      f"{result['records_per_sec'] or 0:>12.1f} rec/s {(result['bytes_per_sec'] or 0) / 1e6:>9.2f} MB/s "
+                      f"{result['peak_rss_mb']:>8.1f} MB RSS")
+                for label, ms in result.get("query_ms", {}).items():
+                    print(f"  {label:<24} {ms:>9.2f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Offline benchmark for the threat feed ingest script")
+    p.add_argument("--script", default=DEFAULT_SCRIPT, help="Ingest script or manifest to benchmark (default: daily_intel_ingest.py).")
+    p.add_argument("--cves", type=int, default=20000, help="CVE_Items in the synthetic NVD feed (default: 20000).")
+    p.add_argument("--techniques", type=int, default=1000, help="attack-patterns in the synthetic STIX bundle (default: 1000).")
+    p.add_argument("--rss_items", type=int, default=50, help="Entries per synthetic CISA feed (default: 50).")
+    p.add_argument("--msrc_pages", type=int, default=10, help="Pages of MSRC results (default: 10).")
+    p.add_argument("--msrc_per_page", type=int, default=100, help="Vulnerabilities per MSRC page (default: 100).")
+    p.add_argument("--latency_ms", type=float, default=0, help="Latency added to every response by the local server (default: 0).")
+    p.add_argument("--throttle_every", type=int, default=0, help="Answer every Nth MSRC request with 429 (default: off).")
+    p.add_argument("--stages", nargs="+", choices=STAGES, help="Stages to run (default: all).")
+    p.add_argument("--repeat", type=int, default=1, help="Runs per stage (default: 1).")
+    p.add_argument("--seed", type=int, default=0, help="Seed for the payload generators (default: 0).")
+    p.add_argument("--json", help="Write the results to this JSON file.")
+    args = p.parse_args()
+
+    results = run_benchmark(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k != "json"}, "results": results}, f, indent=2)
@@ -17,17 +17,47 @@ JSONL files for downstream summarization.
 
 Requirements:
   pip install requests tqdm feedparser
+  pip install zstandard pyarrow  # optional, for --export jsonl.zst / parquet
 
 Usage:
   python3 daily_intel_ingest_v2.py --output_dir /path/to/output --lookback_days 1
+  python3 daily_intel_ingest_v2.py --output_dir /path/to/output --concurrent --max_per_host 2
+  python3 daily_intel_ingest_v2.py --output_dir /path/to/output --export parquet --export jsonl.zst
+  python3 daily_intel_ingest_v2.py --output_dir /path/to/output --backfill 2002-2024 --store intel.db
+  python3 daily_intel_ingest_v2.py --output_dir /path/to/output --correlate --link_alerts
+  python3 daily_intel_ingest_v2.py --output_dir /path/to/output --resume
+  python3 daily_intel_ingest_v2.py --output_dir /path/to/output --daemon --poll_interval cisa_activity=1800
+  python3 daily_intel_ingest_v2.py --output_dir /path/to/output --no_progress --metrics_json run.json --prometheus_textfile intel.prom
 \"\"\"
 
 import os
+import re
+import io
+import math
 import sys
 import json
 import gzip
+import shutil
+import hashlib
+import sqlite3
+import zipfile
+import tempfile
+import time
+import queue
+import random
 import argparse
+import email.utils
 import logging
+import heapq
+import signal
+import threading
+import multiprocessing
+import cProfile
+import tracemalloc
+import contextvars
+from contextlib import contextmanager, closing, ExitStack
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from urllib.parse import urlparse
 from datetime import datetime, timedelta, timezone
 from tqdm import tqdm
 import requests
@@ -38,6 +68,22 @@ except ImportError:
     print("Please install feedparser: pip install feedparser", file=sys.stderr)
     sys.exit(1)
 
+# Optional: only needed for the jsonl.zst and parquet exports
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+# Optional: faster record serialization with --orjson
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure verbose logging
 logger = logging.getLogger("IntelIngest")
 logger.setLevel(logging.DEBUG) # Set to INFO for less verbosity in production
@@ -49,402 +95,3512 @@ if not logger.handlers: # Avoid adding multiple handlers if script is reloaded
     logger.addHandler(ch)
 
 
-DEFAULT_USER_AGENT = "ThreatIntelIngestor/1.0 (+https://github.com/your-repo; contact your-email@example.com)"
+DEFAULT_USER_AGENT = "ThreatIntelIngestor/1.0 (+https://github.com/your-repo; contact your-email@example.com)"
+
+# Feed locations
+NVD_RECENT_URL = "https://nvd.nist.gov/feeds/json/cve/1.1/nvdcve-1.1-recent.json.gz"
+NVD_YEARLY_URL = "https://nvd.nist.gov/feeds/json/cve/1.1/nvdcve-1.1-{year}.json.gz" # --backfill
+NVD_FIRST_YEAR = 2002 # the yearly feeds start at 2002 (which also holds all older CVEs)
+MITRE_ENTERPRISE_URL = "https://cti-taxii.mitre.org/stix/collections/95ecc380-afe9-11e4-9b6c-751b66dd541e/stix-2.1.zip"
+MITRE_ICS_URL = "https://cti-taxii.mitre.org/stix/collections/02c3ef24-9cd4-48f3-a99f-679424e34d7e/stix-2.1.zip"
+CISA_ALERTS_URL = "https://www.cisa.gov/uscert/ncas/alerts.xml"
+CISA_ACTIVITY_URL = "https://www.cisa.gov/uscert/ncas/current-activity.xml"
+MSRC_API_URL = "https://api.msrc.microsoft.com/update-guide/v1/vulnerabilities"
+
+# Per-source network timeouts in seconds (connect/read). The STIX zips are the largest downloads.
+SOURCE_TIMEOUTS = {
+    "nvd": 120,
+    "mitre_enterprise": 180,
+    "mitre_ics": 120,
+    "cisa_alerts": 60,
+    "cisa_activity": 60,
+    "msrc": 60,
+}
+
+# Output file prefix per source: <prefix>_YYYYMMDD.jsonl
+SOURCE_OUTPUT_PREFIXES = {
+    "nvd": "cve_nvd",
+    "mitre_enterprise": "attack_enterprise",
+    "mitre_ics": "attack_ics",
+    "cisa_alerts": "cisa_alerts",
+    "cisa_activity": "cisa_activity",
+    "msrc": "msrc_bulletins",
+}
+
+# Record identity for --delta mode, per source: (key field, change marker field, emits tombstones).
+# A marker of None means the record's normalized JSON line is hashed instead. Tombstones are only
+# emitted for full-snapshot feeds; NVD "recent", MSRC and the RSS feeds are rolling windows, where
+# a record leaving the window has not been withdrawn. A record without its key field is tracked by
+# the hash of its line under DELTA_KEYLESS_PREFIX, so it is delivered once rather than every day.
+DELTA_KEYS = {
+    "nvd": ("cve_id", "last_modified_date", False),
+    "mitre_enterprise": ("technique_id", "modified_date", True),
+    "mitre_ics": ("technique_id", "modified_date", True),
+    "cisa_alerts": ("link", None, False),
+    "cisa_activity": ("link", None, False),
+    "msrc": ("cve_id", None, False),
+}
+DELTA_KEYLESS_PREFIX = "sha1:"
+
+# Poll intervals in seconds for --daemon mode, matched to how often each feed changes
+SOURCE_POLL_INTERVALS = {
+    "nvd": 2 * 3600, # the "recent" feed is regenerated every two hours
+    "mitre_enterprise": 24 * 3600,
+    "mitre_ics": 24 * 3600,
+    "cisa_alerts": 3600,
+    "cisa_activity": 3600,
+    "msrc": 6 * 3600,
+}
+POLL_JITTER = 0.1 # +/- fraction of each interval, so polls do not line up
+
+# Maximum number of simultaneous requests against a single host (e.g. both CISA feeds share www.cisa.gov)
+MAX_REQUESTS_PER_HOST = 2
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+@contextmanager
+def _host_slot(url):
+    \"\"\"
+    Holds one of the MAX_REQUESTS_PER_HOST request slots for the host of 'url'.
+    Keeps concurrent runs from opening more connections to one feed host than it tolerates.
+    \"\"\"
+    host = urlparse(url).netloc
+    with _host_semaphores_lock:
+        sem = _host_semaphores.get(host)
+        if sem is None:
+            sem = threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+            _host_semaphores[host] = sem
+    with sem:
+        yield
+
+
+# Run metrics: wall time, bytes and record counts per (source, stage), HTTP statuses and cache hits
+# per source. The stages of a source nest (decode pulls from decompress, which pulls from fetch), so
+# each stage is charged only its exclusive time and the stage times of a source add up to its total.
+# Work a source overlaps with its own stages (the MSRC page prefetch thread) is kept apart as
+# 'background' stages, outside that sum.
+STAGES = ("fetch", "decompress", "decode", "normalize", "write", "wait", "delta", "store", "inventory", "correlate", "links", "rollup")
+_current_source = contextvars.ContextVar("intel_source", default="pipeline")
+
+class RunMetrics:
+    \"\"\"
+    Thread-safe collector for one run. Stage timings are attributed to the source whose job is
+    running (see _run_source), including threads started from it with contextvars.copy_context().
+    Hot loops open a frame with begin()/end() and report totals once through add(), so per-record
+    instrumentation does not take the lock.
+    \"\"\"
+
+    def __init__(self):
+        self.started = time.time()
+        self.finished = None
+        self.stages = {}
+        self.background = {}
+        self.sources = {}
+        self.tracemalloc_top = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def begin(self):
+        \"\"\"Opens a timing frame on this thread; returns it for end().\"\"\"
+        frame = [time.perf_counter(), 0.0]
+        self._stack().append(frame)
+        return frame
+
+    def end(self, frame):
+        \"\"\"Closes 'frame' and returns its exclusive seconds; its full duration is charged to the enclosing frame.\"\"\"
+        elapsed = time.perf_counter() - frame[0]
+        stack = self._stack()
+        stack.pop()
+        if stack:
+            stack[-1][1] += elapsed
+        return elapsed - frame[1]
+
+    @contextmanager
+    def timer(self, stage, **counts):
+        frame = self.begin()
+        try:
+            yield
+        finally:
+            self.add(stage, seconds=self.end(frame), **counts)
+
+    def _source(self, source):
+        entry = self.sources.get(source)
+        if entry is None:
+            entry = self.sources[source] = {"http_status": {}, "cache_hits": 0, "outputs_reused": 0}
+        return entry
+
+    def add(self, stage, seconds=0.0, nbytes=0, records_in=0, records_out=0, background=False):
+        \"\"\"Adds to the current source's stage totals; 'background' for time overlapping its other stages.\"\"\"
+        key = (_current_source.get(), stage)
+        stages = self.background if background else self.stages
+        with self._lock:
+            entry = stages.get(key)
+            if entry is None:
+                entry = stages[key] = {"seconds": 0.0, "bytes": 0, "records_in": 0, "records_out": 0}
+            entry["seconds"] += seconds
+            entry["bytes"] += nbytes
+            entry["records_in"] += records_in
+            entry["records_out"] += records_out
+
+    def merge(self, stages):
+        \"\"\"Adds stage totals reported by another process (stage -> stats dict) to the current source.\"\"\"
+        for stage, stats in stages.items():
+            self.add(stage, seconds=stats["seconds"], nbytes=stats["bytes"],
+                     records_in=stats["records_in"], records_out=stats["records_out"])
+
+    def inherit(self, previous):
+        \"\"\"Copies over the stages and source entries of sources this run did not touch.\"\"\"
+        with self._lock:
+            touched = set(self.sources) | {source for source, _ in self.stages}
+            for (source, stage), entry in previous.stages.items():
+                if source not in touched and source != "pipeline":
+                    self.stages[(source, stage)] = dict(entry)
+            for (source, stage), entry in previous.background.items():
+                if source not in touched and source != "pipeline":
+                    self.background[(source, stage)] = dict(entry)
+            for source, entry in previous.sources.items():
+                if source not in touched and source != "pipeline":
+                    self.sources[source] = dict(entry)
+
+    def http(self, status):
+        \"\"\"Counts a response status for the current source; a 304 is a cache hit.\"\"\"
+        with self._lock:
+            entry = self._source(_current_source.get())
+            entry["http_status"][str(status)] = entry["http_status"].get(str(status), 0) + 1
+            if status == 304:
+                entry["cache_hits"] += 1
+
+    def output_reused(self):
+        with self._lock:
+            self._source(_current_source.get())["outputs_reused"] += 1
+
+    def source_failed(self):
+        \"\"\"
+        Counts an error the current source's job logged and contained (a failed fetch or parse), so
+        the source is reported as failed even though its job returned normally.
+        \"\"\"
+        with self._lock:
+            entry = self._source(_current_source.get())
+            entry["errors"] = entry.get("errors", 0) + 1
+
+    def source_done(self, source, ok, seconds):
+        \"\"\"
+        Records a finished source with the process peak RSS (and traced heap peak) seen so far.
+        Returns whether it succeeded: 'ok' (its job did not raise) and no errors were counted.
+        \"\"\"
+        with self._lock:
+            entry = self._source(source)
+            ok = entry["ok"] = ok and not entry.get("errors")
+            entry["seconds"] = round(seconds, 3)
+            entry["peak_rss_bytes"] = _peak_rss_bytes()
+            if tracemalloc.is_tracing():
+                entry["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        return ok
+
+    def summary(self):
+        with self._lock:
+            sources = {name: dict(entry, stages={}) for name, entry in self.sources.items()}
+            for (source, stage), entry in self.stages.items():
+                stats = dict(entry, seconds=round(entry["seconds"], 3))
+                sources.setdefault(source, {"http_status": {}, "cache_hits": 0, "outputs_reused": 0, "stages": {}})
+                sources[source]["stages"][stage] = stats
+            for (source, stage), entry in self.background.items():
+                stats = dict(entry, seconds=round(entry["seconds"], 3))
+                sources.setdefault(source, {"http_status": {}, "cache_hits": 0, "outputs_reused": 0, "stages": {}})
+                sources[source].setdefault("background", {})[stage] = stats
+        finished = self.finished or time.time()
+        return {
+            "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            "finished": datetime.fromtimestamp(finished, timezone.utc).isoformat(),
+            "seconds": round(finished - self.started, 3),
+            "peak_rss_bytes": _peak_rss_bytes(),
+            "sources": sources,
+            "tracemalloc_top": self.tracemalloc_top,
+        }
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.summary(), indent=2) + "\\n")
+
+    def write_prometheus(self, path):
+        \"\"\"Writes the summary in the Prometheus text format, e.g. for node_exporter's textfile collector.\"\"\"
+        summary = self.summary()
+        metrics = {}
+
+        def sample(name, help_text, labels, value):
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            metrics.setdefault(name, (help_text, []))[1].append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+
+        sample("intel_ingest_run_seconds", "Wall time of the last ingest run.", {}, summary["seconds"])
+        sample("intel_ingest_last_run_timestamp_seconds", "Unix time the last ingest run finished.", {},
+               round(self.finished or time.time(), 3))
+        sample("intel_ingest_peak_rss_bytes", "Peak resident set size of the ingest process.", {}, summary["peak_rss_bytes"])
+        for source, entry in sorted(summary["sources"].items()):
+            if "ok" in entry:
+                sample("intel_ingest_source_success", "1 if the source's job completed without errors.",
+                       {"source": source}, int(entry["ok"]))
+                sample("intel_ingest_source_errors", "Fetch and parse errors the source's job logged.",
+                       {"source": source}, entry.get("errors", 0))
+                sample("intel_ingest_source_seconds", "Wall time of the source's job.", {"source": source}, entry["seconds"])
+                sample("intel_ingest_source_peak_rss_bytes", "Process peak RSS when the source finished.",
+                       {"source": source}, entry["peak_rss_bytes"])
+            for status, count in sorted(entry["http_status"].items()):
+                sample("intel_ingest_http_responses", "HTTP responses by status.",
+                       {"source": source, "status": status}, count)
+            sample("intel_ingest_cache_hits", "Conditional requests answered 304.", {"source": source}, entry["cache_hits"])
+            sample("intel_ingest_outputs_reused", "Outputs reused from the previous run on a 304.",
+                   {"source": source}, entry["outputs_reused"])
+            for stage, stats in sorted(entry["stages"].items()):
+                labels = {"source": source, "stage": stage}
+                sample("intel_ingest_stage_seconds", "Exclusive wall time per source and stage.", labels, stats["seconds"])
+                sample("intel_ingest_stage_bytes", "Bytes read (fetch/decompress) or written (write) per stage.", labels, stats["bytes"])
+                sample("intel_ingest_stage_records_in", "Records decoded per stage.", labels, stats["records_in"])
+                sample("intel_ingest_stage_records_out", "Records written per stage.", labels, stats["records_out"])
+            for stage, stats in sorted(entry.get("background", {}).items()):
+                labels = {"source": source, "stage": stage}
+                sample("intel_ingest_background_stage_seconds",
+                       "Wall time per source and stage of work overlapped with its other stages (not in their sum).",
+                       labels, stats["seconds"])
+                sample("intel_ingest_background_stage_bytes", "Bytes read per background stage.", labels, stats["bytes"])
+                sample("intel_ingest_background_stage_records_in", "Records decoded per background stage.",
+                       labels, stats["records_in"])
+
+        lines = []
+        for name, (help_text, samples) in metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        _write_atomic(path, "\\n".join(lines) + "\\n")
+
+    def log_summary(self):
+        for source, entry in sorted(self.summary()["sources"].items()):
+            stages = ", ".join(f"{stage} {stats['seconds']:.2f}s" for stage, stats in
+                               sorted(entry["stages"].items(), key=lambda item: -item[1]["seconds"]))
+            logger.info(f"Metrics {source}: {stages or 'no stages recorded'}")
+
+
+# Replaced by main() at the start of every run; SHOW_PROGRESS=False (--no_progress) disables the tqdm bars
+METRICS = RunMetrics()
+SHOW_PROGRESS = True
+
+def _peak_rss_bytes():
+    \"\"\"Peak resident set size of this process (0 where the resource module is unavailable).\"\"\"
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # kilobytes on Linux
+
+
+def _write_atomic(path, text):
+    with _open_atomic(path) as f:
+        f.write(text)
+
+
+@contextmanager
+def _open_atomic(path):
+    \"\"\"Text file for writing at a temp name that replaces 'path' only if the block completes.\"\"\"
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class _MeteredReader(io.RawIOBase):
+    \"\"\"Read-only stream over 'raw' that charges its read time and byte count to 'stage' when closed.\"\"\"
+
+    def __init__(self, raw, stage):
+        self._raw = raw
+        self._stage = stage
+        self._seconds = 0.0
+        self._bytes = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        frame = METRICS.begin()
+        try:
+            data = self._raw.read(len(b))
+        finally:
+            self._seconds += METRICS.end(frame)
+        n = len(data)
+        b[:n] = data
+        self._bytes += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            METRICS.add(self._stage, seconds=self._seconds, nbytes=self._bytes)
+        super().close()
+
+
+def _metered_items(items, stage="decode"):
+    \"\"\"Yields from 'items', charging the time spent producing each one to 'stage' (records_in).\"\"\"
+    it = iter(items)
+    seconds = 0.0
+    count = 0
+    try:
+        while True:
+            frame = METRICS.begin()
+            try:
+                item = next(it, _END)
+            finally:
+                seconds += METRICS.end(frame)
+            if item is _END:
+                return
+            count += 1
+            yield item
+    finally:
+        METRICS.add(stage, seconds=seconds, records_in=count)
+
+_END = object()
+
+
+def _make_json_encoder():
+    \"\"\"
+    Returns record -> json.dumps(record), reusing the C encoder that json.dumps builds on every call
+    (without its circular-reference check; records are trees). Falls back to JSONEncoder.encode.
+    \"\"\"
+    encoder = json.JSONEncoder()
+    c_make_encoder = getattr(json.encoder, "c_make_encoder", None)
+    if c_make_encoder is not None:
+        try:
+            c_encode = c_make_encoder(None, encoder.default, json.encoder.encode_basestring_ascii, None,
+                                      encoder.key_separator, encoder.item_separator, False, False, True)
+            return lambda record: "".join(c_encode(record, 0))
+        except TypeError: # a Python whose C encoder takes other arguments
+            pass
+    return encoder.encode
+
+_encode_json = _make_json_encoder()
+
+
+def _json_line(record):
+    \"\"\"One JSONL line, byte-identical to json.dumps(record) + "\\\\n".\"\"\"
+    return _encode_json(record) + "\\n"
+
+
+def _orjson_line(record):
+    \"\"\"One JSONL line from orjson: the same JSON values, but compact and with non-ASCII text unescaped.\"\"\"
+    return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE).decode("utf-8")
+
+
+# Record serializer used by RecordWriter; main() switches to _orjson_line with --orjson
+SERIALIZE_RECORD = _json_line
+WRITE_BATCH_RECORDS = 1024 # records serialized and written per batch
+
+
+class RecordWriter:
+    \"\"\"
+    Output handed to the parsers by open_output(). write_record() queues one normalized record; each
+    batch of WRITE_BATCH_RECORDS is serialized with SERIALIZE_RECORD, written in one call, passed on
+    to any export sinks and counted on the 'progress' bar, so none of that runs per record. The time
+    spent is charged to "write".
+    A parser that stops early but wants what it wrote published sets 'incomplete' (see open_output).
+    \"\"\"
+
+    def __init__(self, f, frame, sinks=(), progress=None):
+        self._f = f
+        self._frame = frame
+        self._sinks = sinks
+        self._progress = progress
+        self._batch = []
+        self.seconds = 0.0
+        self.bytes = 0
+        self.records = 0
+        self.incomplete = False
+
+    def write_record(self, record):
+        self._batch.append(record)
+        if len(self._batch) >= WRITE_BATCH_RECORDS:
+            self.flush()
+
+    def flush(self):
+        \"\"\"Writes out the queued records.\"\"\"
+        batch = self._batch
+        if not batch:
+            return
+        self._batch = []
+        started = time.perf_counter()
+        serialize = SERIALIZE_RECORD
+        lines = [serialize(record) for record in batch]
+        self._f.write("".join(lines))
+        for sink in self._sinks:
+            for record, line in zip(batch, lines):
+                sink.write(record, line)
+        elapsed = time.perf_counter() - started
+        self._frame[1] += elapsed
+        self.seconds += elapsed
+        self.bytes += sum(map(len, lines))
+        self.records += len(batch)
+        if self._progress is not None:
+            self._progress.update(len(batch))
+
+    def sync(self):
+        \"\"\"Flushes everything written so far to disk. Returns the partial file's size in bytes, a resume offset.\"\"\"
+        self.flush()
+        started = time.perf_counter()
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        elapsed = time.perf_counter() - started
+        self._frame[1] += elapsed
+        self.seconds += elapsed
+        return os.fstat(self._f.fileno()).st_size
+
+
+def _partial_path(path):
+    return f"{path}.partial"
+
+
+@contextmanager
+def open_output(path, resume_offset=None, keep_partial=False, progress=None):
+    \"\"\"
+    Opens a source's JSONL output for writing, plus its sinks (EXPORTER partitions, ROLLUP) if any.
+    Records go to <path>.partial, which replaces 'path' only once the block completes, so a failed
+    run leaves the previous output intact instead of a truncated one. If the writer was marked
+    'incomplete', the records are published to 'path' but the partial file is kept for a resume.
+    With 'resume_offset' the existing partial file is cut to that many bytes and appended to (its
+    records are replayed into the sinks first); with 'keep_partial' it survives a failure.
+    'progress' is an optional tqdm bar advanced by the records written.
+    While it is open, time not spent in nested stages (decoding input, writing records) is charged
+    to "normalize". Sinks are only committed if the block completes without raising.
+    \"\"\"
+    sinks = _output_sinks(path)
+    partial_path = _partial_path(path)
+    if resume_offset is not None:
+        with open(partial_path, "r+b") as f:
+            f.truncate(resume_offset)
+        with METRICS.timer("write"), open(partial_path, encoding="utf-8") as in_f:
+            for line in in_f:
+                record = json.loads(line)
+                for sink in sinks:
+                    sink.write(record, line)
+    committed = False
+    with open(partial_path, "a" if resume_offset is not None else "w", encoding="utf-8") as f:
+        frame = METRICS.begin()
+        writer = RecordWriter(f, frame, sinks, progress=progress)
+        try:
+            yield writer
+            writer.flush()
+            started = time.perf_counter()
+            for sink in sinks:
+                sink.commit()
+            elapsed = time.perf_counter() - started
+            writer.seconds += elapsed
+            frame[1] += elapsed
+            committed = True
+        finally:
+            if not committed:
+                for sink in sinks:
+                    sink.discard()
+            METRICS.add("normalize", seconds=METRICS.end(frame))
+            METRICS.add("write", seconds=writer.seconds, nbytes=writer.bytes, records_out=writer.records)
+            if not committed and not keep_partial:
+                f.close()
+                os.remove(partial_path)
+    if writer.incomplete:
+        with _open_atomic(path) as out_f, open(partial_path, encoding="utf-8") as in_f:
+            shutil.copyfileobj(in_f, out_f)
+    else:
+        os.replace(partial_path, path)
+        _output_completed(path)
+
+
+# Checkpoints: a per-day manifest of what each run finished, so a rerun with --resume skips the
+# sources already completed that day and continues MSRC pagination from the last written page.
+CHECKPOINT = None # set by run_ingest
+
+
+class RunCheckpoint:
+    \"\"\"
+    Checkpoint manifest <output_dir>/.checkpoint_YYYYMMDD.json, saved on every change:
+    { "day", "started", "sources": { source: { "status": "running" | "done", "finished",
+    "payload_sha256", "pagination" } } }. 'payload_sha256' is the hash of the payload the source's
+    current output was parsed from; 'pagination' is the state of an unfinished MSRC run.
+    Progress is always recorded; completed sources and pagination are only honoured with 'resume'.
+    \"\"\"
+
+    def __init__(self, output_dir, day, resume=False):
+        self.path = os.path.join(output_dir, f".checkpoint_{day}.json")
+        self.day = day
+        self.resume = resume
+        self._lock = threading.Lock()
+        self._payloads = {} # source -> hash of the payload being parsed this run
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._doc = json.load(f)
+        except (OSError, ValueError):
+            self._doc = {"day": day, "started": time.time(), "sources": {}}
+            for name in os.listdir(output_dir):
+                # Earlier days' outputs are never resumed
+                if name.startswith(".checkpoint_") and name != os.path.basename(self.path):
+                    os.remove(os.path.join(output_dir, name))
+
+    @property
+    def started(self):
+        \"\"\"time.time() at which the day's first run started.\"\"\"
+        return self._doc["started"]
+
+    def _entry(self, source):
+        return self._doc["sources"].setdefault(source, {})
+
+    def _save(self):
+        _write_atomic(self.path, json.dumps(self._doc))
+
+    def completed_sources(self):
+        with self._lock:
+            return {source for source, entry in self._doc["sources"].items() if entry.get("status") == "done"}
+
+    def start(self, source):
+        with self._lock:
+            self._entry(source)["status"] = "running"
+            self._payloads.pop(source, None)
+            self._save()
+
+    def complete(self, source):
+        with self._lock:
+            entry = self._entry(source)
+            entry["status"] = "done"
+            entry["finished"] = datetime.now(timezone.utc).isoformat()
+            if source in self._payloads:
+                entry["payload_sha256"] = self._payloads.pop(source)
+            entry.pop("pagination", None)
+            self._save()
+
+    def payload_fetched(self, source, digest):
+        \"\"\"Notes the hash of the payload about to be parsed. True if the current output came from the same bytes.\"\"\"
+        with self._lock:
+            self._payloads[source] = digest
+            return self._doc["sources"].get(source, {}).get("payload_sha256") == digest
+
+    def pagination(self, source):
+        \"\"\"Saved pagination state of an unfinished run of 'source' (None unless resuming).\"\"\"
+        with self._lock:
+            return self._doc["sources"].get(source, {}).get("pagination") if self.resume else None
+
+    def save_pagination(self, source, state):
+        with self._lock:
+            entry = self._entry(source)
+            if state is None:
+                entry.pop("pagination", None)
+            else:
+                entry["pagination"] = state
+            self._save()
+
+
+def _output_completed(output_path):
+    \"\"\"Marks the source whose primary output is 'output_path' as completed in the day's CHECKPOINT.\"\"\"
+    source, day = _output_source(output_path)
+    if source is not None and CHECKPOINT is not None and CHECKPOINT.day == day:
+        CHECKPOINT.complete(source)
+
+
+def _file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _payload_unchanged(output_path, digest, also=()):
+    \"\"\"
+    Records the hash of the payload about to be parsed into output_path. If output_path (and the
+    'also' paths) already hold the parse of identical bytes, the output is reused and True returned,
+    so the parse can be skipped.
+    \"\"\"
+    source, day = _output_source(output_path)
+    if source is None or CHECKPOINT is None or CHECKPOINT.day != day:
+        return False
+    if not CHECKPOINT.payload_fetched(source, digest):
+        return False
+    if not all(os.path.exists(path) for path in (output_path, *also)):
+        return False
+    logger.info(f"Payload unchanged since {output_path} was written; reusing it")
+    _output_reused(output_path)
+    return True
+
+
+# Exports (--export): compressed or columnar copies of each source's output, written in the same
+# pass as the JSONL and partitioned Hive-style as <export_dir>/<format>/source=<source>/date=<YYYY-MM-DD>/.
+EXPORT_FORMATS = ("jsonl.gz", "jsonl.zst", "parquet")
+EXPORT_ROW_GROUP_SIZE = 65536 # rows buffered per Parquet row group
+EXPORT_ZSTD_LEVEL = 10
+
+# Parquet columns per source: (column, type, record field or (field, subfield)). Types are
+# "string", "float", "timestamp" (UTC, parsed from the ISO dates) and "list" (of strings).
+_CVSS_COLUMNS = [
+    ("cvss_base_score", "float", ("cvss", "baseScore")),
+    ("cvss_severity", "string", ("cvss", "severity")),
+    ("cvss_vector", "string", ("cvss", "vectorString")),
+]
+_ATTACK_COLUMNS = [
+    ("framework", "string", "framework"),
+    ("technique_id", "string", "technique_id"),
+    ("name", "string", "name"),
+    ("description", "string", "description"),
+    ("tactics", "list", "tactics"),
+    ("platforms", "list", "platforms"),
+    ("data_sources", "list", "data_sources"),
+    ("created_date", "timestamp", "created_date"),
+    ("modified_date", "timestamp", "modified_date"),
+]
+_CISA_COLUMNS = [
+    ("type", "string", "type"),
+    ("title", "string", "title"),
+    ("link", "string", "link"),
+    ("published_date", "timestamp", "published_date"),
+    ("summary", "string", "summary"),
+]
+EXPORT_COLUMNS = {
+    "nvd": [
+        ("cve_id", "string", "cve_id"),
+        ("cvss_version", "string", ("cvss", "version")),
+        *_CVSS_COLUMNS,
+        ("published_date", "timestamp", "published_date"),
+        ("last_modified_date", "timestamp", "last_modified_date"),
+        ("description", "string", "description"),
+        ("references", "list", "references"),
+        ("cpes", "list", "cpes"),
+    ],
+    "mitre_enterprise": _ATTACK_COLUMNS,
+    "mitre_ics": _ATTACK_COLUMNS,
+    "cisa_alerts": _CISA_COLUMNS,
+    "cisa_activity": _CISA_COLUMNS,
+    "msrc": [
+        ("cve_id", "string", "cve_id"),
+        ("title", "string", "title"),
+        ("description", "string", "description"),
+        ("published_date", "timestamp", "published_date"),
+        *_CVSS_COLUMNS,
+        ("affected_products", "list", "affected_products"),
+        ("exploited_status", "string", "exploited_status"),
+        ("publicly_disclosed", "string", "publicly_disclosed"),
+        ("msrc_url", "string", "msrc_url"),
+    ],
+}
+_OUTPUT_NAME_RE = re.compile(r"^(.+)_(\\d{8})\\.jsonl$")
+_PREFIX_SOURCES = {prefix: source for source, prefix in SOURCE_OUTPUT_PREFIXES.items()}
+
+# Set by main() when --export is given
+EXPORTER = None
+
+
+def _parse_timestamp(value):
+    \"\"\"Parses the feeds' ISO 8601 dates ("...Z", with or without seconds) to an aware UTC datetime; None if unparseable.\"\"\"
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def _export_value(record, kind, field):
+    if isinstance(field, str):
+        value = record.get(field)
+    else:
+        value = (record.get(field[0]) or {}).get(field[1])
+    if value is None:
+        return None
+    if kind == "timestamp":
+        return _parse_timestamp(value)
+    if kind == "float":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if kind == "list":
+        return [str(v) for v in value if v is not None] if isinstance(value, list) else None
+    return str(value)
+
+
+class _CompressedJsonlSink:
+    \"\"\"Same JSONL lines, gzip- or zstd-compressed, into a temp file renamed into place on commit.\"\"\"
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        if fmt == "jsonl.gz":
+            self._f = gzip.open(self.tmp_path, "wt", encoding="utf-8")
+        else:
+            raw = open(self.tmp_path, "wb")
+            self._f = io.TextIOWrapper(zstandard.ZstdCompressor(level=EXPORT_ZSTD_LEVEL).stream_writer(raw),
+                                       encoding="utf-8")
+
+    def write(self, record, line):
+        self._f.write(line)
+
+    def commit(self):
+        self._f.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        self._f.close()
+        os.remove(self.tmp_path)
+
+
+class _ParquetSink:
+    \"\"\"Typed columns per EXPORT_COLUMNS, buffered into row groups of EXPORT_ROW_GROUP_SIZE records.\"\"\"
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.columns = columns
+        fields = []
+        for name, kind, _ in columns:
+            if kind == "timestamp":
+                arrow_type = pyarrow.timestamp("us", tz="UTC")
+            elif kind == "list":
+                arrow_type = pyarrow.list_(pyarrow.string())
+            elif kind == "float":
+                arrow_type = pyarrow.float64()
+            else:
+                arrow_type = pyarrow.string()
+            fields.append(pyarrow.field(name, arrow_type))
+        self.schema = pyarrow.schema(fields)
+        self._writer = pyarrow.parquet.ParquetWriter(self.tmp_path, self.schema, compression="zstd")
+        self._reset()
+
+    def _reset(self):
+        self._batch = {name: [] for name, _, _ in self.columns}
+        self._rows = 0
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(pyarrow.Table.from_pydict(self._batch, schema=self.schema),
+                                     row_group_size=EXPORT_ROW_GROUP_SIZE)
+            self._reset()
+
+    def write(self, record, line):
+        for name, kind, field in self.columns:
+            self._batch[name].append(_export_value(record, kind, field))
+        self._rows += 1
+        if self._rows >= EXPORT_ROW_GROUP_SIZE:
+            self._flush()
+
+    def commit(self):
+        self._flush()
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        self._writer.close()
+        os.remove(self.tmp_path)
+
+
+class OutputExporter:
+    \"\"\"
+    Creates the export sinks for a source output. Formats whose optional dependency is missing
+    (zstandard for jsonl.zst, pyarrow for parquet) are dropped with an error at startup.
+    \"\"\"
+
+    def __init__(self, export_dir, formats):
+        self.export_dir = export_dir
+        self.formats = []
+        for fmt in dict.fromkeys(formats):
+            if fmt == "jsonl.zst" and zstandard is None:
+                logger.error("Export format jsonl.zst needs zstandard (pip install zstandard); skipping it.")
+            elif fmt == "parquet" and pyarrow is None:
+                logger.error("Export format parquet needs pyarrow (pip install pyarrow); skipping it.")
+            else:
+                self.formats.append(fmt)
+
+    def sinks(self, source, day):
+        \"\"\"Export sinks for the output of 'source' on 'day' (YYYYMMDD).\"\"\"
+        partition = os.path.join(f"source={source}", f"date={day[:4]}-{day[4:6]}-{day[6:]}")
+        prefix = SOURCE_OUTPUT_PREFIXES[source]
+        sinks = []
+        for fmt in self.formats:
+            os.makedirs(os.path.join(self.export_dir, fmt, partition), exist_ok=True)
+            path = os.path.join(self.export_dir, fmt, partition, f"{prefix}.{fmt}")
+            sinks.append(_ParquetSink(path, EXPORT_COLUMNS[source]) if fmt == "parquet" else _CompressedJsonlSink(path, fmt))
+        return sinks
+
+
+def _output_source(output_path):
+    \"\"\"(source, YYYYMMDD) if 'output_path' is a source's primary output (<prefix>_YYYYMMDD.jsonl), else (None, None).\"\"\"
+    match = _OUTPUT_NAME_RE.match(os.path.basename(output_path))
+    source = _PREFIX_SOURCES.get(match.group(1)) if match else None
+    return (source, match.group(2)) if source else (None, None)
+
+
+def _output_sinks(output_path):
+    \"\"\"The sinks that see every record written to 'output_path': export partitions and the day's rollup.\"\"\"
+    source, day = _output_source(output_path)
+    if source is None:
+        return []
+    sinks = EXPORTER.sinks(source, day) if EXPORTER is not None else []
+    if ROLLUP is not None and ROLLUP.day == day:
+        sinks.append(ROLLUP.sink(source))
+    return sinks
+
+
+def _output_reused(output_path):
+    \"\"\"
+    Bookkeeping for an output reused from the previous run instead of parsed again: its records
+    are replayed from the file into the sinks a fresh parse would have fed.
+    \"\"\"
+    METRICS.output_reused()
+    sinks = _output_sinks(output_path)
+    if not sinks:
+        _output_completed(output_path)
+        return
+    with METRICS.timer("write"):
+        try:
+            with open(output_path, encoding="utf-8") as in_f:
+                for line in in_f:
+                    record = json.loads(line)
+                    for sink in sinks:
+                        sink.write(record, line)
+        except Exception:
+            for sink in sinks:
+                sink.discard()
+            raise
+        for sink in sinks:
+            sink.commit()
+    _output_completed(output_path)
+
+
+# Shared keep-alive session; connections to each feed host are pooled across requests and sources
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    \"\"\"Returns the process-wide pooled requests.Session, creating it on first use.\"\"\"
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=8)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session.headers["User-Agent"] = DEFAULT_USER_AGENT
+        return _session
+
+
+# Retry policy for paginated APIs (MSRC)
+RETRY_MAX_ATTEMPTS = 6
+RETRY_BACKOFF_BASE = 2.0 # seconds, doubled per attempt
+RETRY_BACKOFF_MAX = 120.0
+RETRY_AFTER_MAX = 300.0 # a longer Retry-After fails the page instead of stalling the run; --resume continues from it
+MSRC_PAGE_PREFETCH = 2 # pages buffered between the fetch thread and the writer
+
+def _retry_after_seconds(value):
+    \"\"\"Parses a Retry-After header (delta-seconds or HTTP-date). Returns None if absent or invalid.\"\"\"
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def request_with_backoff(session, url, headers=None, timeout=60, max_attempts=None):
+    \"\"\"
+    GET through 'session', retrying 429s, 5xx responses, connection errors and timeouts.
+    Waits as long as the server's Retry-After asks (up to RETRY_AFTER_MAX; a longer wait raises at
+    once), otherwise backs off exponentially with jitter.
+    Returns the successful response; raises the last error once max_attempts is exhausted.
+    \"\"\"
+    max_attempts = max_attempts or RETRY_MAX_ATTEMPTS
+    for attempt in range(1, max_attempts + 1):
+        delay = None
+        try:
+            with _host_slot(url):
+                resp = session.get(url, headers=headers, timeout=timeout)
+            METRICS.http(resp.status_code)
+            if resp.status_code != 429 and resp.status_code < 500:
+                resp.raise_for_status()
+                return resp
+            if attempt == max_attempts:
+                resp.raise_for_status()
+            delay = _retry_after_seconds(resp.headers.get("Retry-After"))
+            if delay is not None and delay > RETRY_AFTER_MAX:
+                logger.warning(f"{url.split('?')[0]} asks to retry in {delay:.0f}s (over {RETRY_AFTER_MAX:.0f}s); giving up")
+                resp.raise_for_status()
+            reason = f"HTTP {resp.status_code}"
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_attempts:
+                raise
+            reason = type(e).__name__
+        if delay is None:
+            delay = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+        logger.warning(f"{reason} from {url.split('?')[0]}; retrying in {delay:.1f}s (attempt {attempt}/{max_attempts})")
+        time.sleep(delay)
+
+
+# Returned by the fetch functions instead of content when the server answered 304 and the
+# normalized output of the previous run was reused, so the parse stage can be skipped.
+NOT_MODIFIED = object()
+
+# Set by main() when --cache_dir is given
+HTTP_CACHE = None
+
+class HttpCache:
+    \"\"\"
+    Persistent on-disk HTTP response cache keyed by URL.
+    Each entry holds the raw response body plus its ETag / Last-Modified validators, so the next
+    run can revalidate with a conditional GET, and the path of the normalized JSONL produced from
+    that body, so a 304 can reuse it instead of parsing again. Least recently used entries are
+    evicted once the cached bodies exceed max_bytes.
+    \"\"\"
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url, suffix):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + suffix)
+
+    def _load_meta(self, url):
+        try:
+            with open(self._path(url, ".json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url or not os.path.exists(self._path(url, ".body")):
+            return None
+        return meta
+
+    def _save_meta(self, url, meta):
+        path = self._path(url, ".json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def conditional_headers(self, url):
+        \"\"\"Returns If-None-Match / If-Modified-Since headers for url (empty if not cached) and marks the entry as used.\"\"\"
+        meta = self._load_meta(url)
+        if not meta:
+            return {}
+        meta["last_used"] = time.time()
+        self._save_meta(url, meta)
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def open_body(self, url):
+        return open(self._path(url, ".body"), "rb")
+
+    def begin(self, url, resp_headers):
+        \"\"\"
+        Starts caching a 200 response body. Returns a writer, or None when the response carries
+        no validators (it could never be revalidated, so caching it would only waste space).
+        \"\"\"
+        etag = resp_headers.get("ETag")
+        last_modified = resp_headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return None
+        return _CacheWriter(self, url, etag, last_modified)
+
+    def _commit(self, url, tmp_body_path, etag, last_modified, size):
+        with self._lock:
+            os.replace(tmp_body_path, self._path(url, ".body"))
+            now = time.time()
+            self._save_meta(url, {
+                "url": url,
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": size,
+                "stored_at": now,
+                "last_used": now,
+                "output": None,
+            })
+            self._evict()
+
+    def record_output(self, url, output_path):
+        \"\"\"Remembers output_path as the normalized output of url's currently cached body.\"\"\"
+        meta = self._load_meta(url)
+        if meta:
+            meta["output"] = os.path.abspath(output_path)
+            self._save_meta(url, meta)
+
+    def reuse_output(self, url, output_path):
+        \"\"\"Copies the normalized output recorded for url to output_path. Returns False if there is none.\"\"\"
+        meta = self._load_meta(url)
+        previous = meta.get("output") if meta else None
+        if not previous or not os.path.exists(previous):
+            return False
+        if os.path.abspath(output_path) != previous:
+            with _open_atomic(output_path) as out_f, open(previous, encoding="utf-8") as in_f:
+                shutil.copyfileobj(in_f, out_f)
+            self.record_output(url, output_path)
+        return True
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.cache_dir, name), encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            entries.append((meta.get("last_used", 0), meta.get("size", 0), name[:-len(".json")], meta.get("url")))
+        total = sum(entry[1] for entry in entries)
+        for _, size, key, url in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for suffix in (".body", ".json"):
+                try:
+                    os.remove(os.path.join(self.cache_dir, key + suffix))
+                except FileNotFoundError:
+                    pass
+            total -= size
+            logger.info(f"Evicted {url} from HTTP cache ({size} bytes)")
+
+
+class _CacheWriter:
+    \"\"\"Writes a response body to a temp file and installs it into the HttpCache on commit.\"\"\"
+
+    def __init__(self, cache, url, etag, last_modified):
+        self.cache = cache
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = 0
+        self.tmp_path = cache._path(url, f".body.{threading.get_ident()}.tmp")
+        self._f = open(self.tmp_path, "wb")
+
+    def write(self, data):
+        self._f.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        self._f.close()
+        self.cache._commit(self.url, self.tmp_path, self.etag, self.last_modified, self.size)
+
+    def discard(self):
+        self._f.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class _TeeReader(io.RawIOBase):
+    \"\"\"Read-only stream that copies everything read from 'raw' into 'sink'.\"\"\"
+
+    def __init__(self, raw, sink):
+        self._raw = raw
+        self._sink = sink
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._raw.read(len(b))
+        n = len(data)
+        b[:n] = data
+        if n:
+            self._sink.write(data)
+        return n
+
+
+def _record_cached_output(url, output_path, written):
+    \"\"\"After a successful parse, ties output_path to the cached response it was produced from.\"\"\"
+    if HTTP_CACHE is not None and written is not None:
+        HTTP_CACHE.record_output(url, output_path)
+
+
+def fetch_url(url, headers=None, decompress_gzip=False, timeout=60, is_json=True, reuse_output=None):
+    \"\"\"
+    Fetches content from a URL. If decompress_gzip is True, decompresses gzip.
+    Returns raw bytes (decompressed if needed) or parsed JSON if is_json is True.
+    With an HTTP_CACHE the request is conditional; on a 304 the cached body is returned, or, if
+    'reuse_output' is given and a normalized output exists for this body, that output is copied
+    to 'reuse_output' and NOT_MODIFIED is returned.
+    \"\"\"
+    effective_headers = {"User-Agent": DEFAULT_USER_AGENT}
+    if headers:
+        effective_headers.update(headers)
+    cache = HTTP_CACHE
+    if cache is not None:
+        effective_headers.update(cache.conditional_headers(url))
+    
+    raw_bytes = b""
+    frame = METRICS.begin()
+    try:
+        logger.info(f"Fetching: {url}")
+        try:
+            with _host_slot(url):
+                resp = get_session().get(url, headers=effective_headers, timeout=timeout, stream=True)
+                METRICS.http(resp.status_code)
+                if resp.status_code == 304 and cache is not None:
+                    resp.close()
+                    if reuse_output and cache.reuse_output(url, reuse_output):
+                        logger.info(f"Not modified: {url}; reused previous output for {reuse_output}")
+                        _output_reused(reuse_output)
+                        return NOT_MODIFIED
+                    logger.info(f"Not modified: {url}; using cached response")
+                    with cache.open_body(url) as cached_f:
+                        raw_bytes = cached_f.read()
+                else:
+                    with closing(resp): # hands the connection back to the session's pool
+                        resp.raise_for_status()
+                        # The session asks for gzip/deflate; undo any Content-Encoding as requests would
+                        resp.raw.decode_content = True
+                        raw_bytes = resp.raw.read()
+                    writer = cache.begin(url, resp.headers) if cache is not None else None
+                    if writer:
+                        writer.write(raw_bytes)
+                        writer.commit()
+        finally:
+            METRICS.add("fetch", seconds=METRICS.end(frame), nbytes=len(raw_bytes))
+
+        if decompress_gzip:
+            with METRICS.timer("decompress"):
+                content_bytes = gzip.decompress(raw_bytes)
+            METRICS.add("decompress", nbytes=len(content_bytes))
+        else:
+            content_bytes = raw_bytes
+
+        if is_json:
+            with METRICS.timer("decode"):
+                return json.loads(content_bytes.decode('utf-8'))
+        return content_bytes
+    except requests.RequestException as e:
+        logger.error(f"Error fetching {url}: {e}")
+        METRICS.source_failed()
+        return None
+    except json.JSONDecodeError as e:
+        logger.error(f"Error decoding JSON from {url}: {e}")
+        METRICS.source_failed()
+        return None
+    except gzip.BadGzipFile as e:
+        logger.error(f"Error decompressing Gzip from {url}: {e}")
+        METRICS.source_failed()
+        return None
+    except OSError as e:
+        logger.error(f"Error reading cached response for {url}: {e}")
+        METRICS.source_failed()
+        return None
+
+def fetch_to_file(url, dest_path, headers=None, timeout=60, reuse_output=None, chunk_size=1 << 20):
+    \"\"\"
+    Downloads url into dest_path chunk by chunk, so large payloads (the ATT&CK zips) are spooled to
+    disk instead of held in memory. Returns dest_path, None on a fetch error, or NOT_MODIFIED.
+    HTTP_CACHE handling is as in fetch_url; a 304 without a reusable output copies the cached body
+    to dest_path.
+    \"\"\"
+    effective_headers = {"User-Agent": DEFAULT_USER_AGENT}
+    if headers:
+        effective_headers.update(headers)
+    cache = HTTP_CACHE
+    if cache is not None:
+        effective_headers.update(cache.conditional_headers(url))
+
+    writer = None
+    fetched = 0
+    frame = METRICS.begin()
+    try:
+        logger.info(f"Fetching to {dest_path}: {url}")
+        with _host_slot(url):
+            resp = get_session().get(url, headers=effective_headers, timeout=timeout, stream=True)
+            METRICS.http(resp.status_code)
+            with closing(resp):
+                if resp.status_code == 304 and cache is not None:
+                    if reuse_output and cache.reuse_output(url, reuse_output):
+                        logger.info(f"Not modified: {url}; reused previous output for {reuse_output}")
+                        _output_reused(reuse_output)
+                        return NOT_MODIFIED
+                    logger.info(f"Not modified: {url}; using cached response")
+                    with cache.open_body(url) as cached_f, open(dest_path, "wb") as out_f:
+                        shutil.copyfileobj(cached_f, out_f)
+                    return dest_path
+                resp.raise_for_status()
+                writer = cache.begin(url, resp.headers) if cache is not None else None
+                resp.raw.decode_content = True # strip any Content-Encoding
+                with open(dest_path, "wb") as out_f:
+                    while True:
+                        chunk = resp.raw.read(chunk_size)
+                        if not chunk:
+                            break
+                        fetched += len(chunk)
+                        out_f.write(chunk)
+                        if writer:
+                            writer.write(chunk)
+        if writer:
+            writer.commit()
+            writer = None
+        return dest_path
+    except (requests.RequestException, OSError) as e:
+        logger.error(f"Error fetching {url}: {e}")
+        METRICS.source_failed()
+        return None
+    finally:
+        METRICS.add("fetch", seconds=METRICS.end(frame), nbytes=fetched)
+        if writer:
+            writer.discard()
+
+_JSON_WS = re.compile(r"\\s*")
+_JSON_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+def stream_json_array(fp, key, chunk_size=1 << 16):
+    \"\"\"
+    Yields the elements of the top-level array 'key' of a JSON document, one at a time.
+    'fp' is a text stream; it is read in chunks so only the current element (plus one chunk)
+    is held in memory, no matter how large the document is. Other top-level members are
+    decoded and discarded. Raises ValueError on malformed or truncated input.
+    \"\"\"
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def peek():
+        nonlocal pos
+        while True:
+            pos = _JSON_WS.match(buf, pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def decode():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # A number at the buffer edge may be cut short ("1." decodes as 1); only accept a value
+                # once the character after it is known not to continue it
+                if eof or (end < len(buf) and buf[end] not in _JSON_NUMBER_CHARS):
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    def separator(closing):
+        \"\"\"Consumes the ',' after a member or element; returns True at the closing bracket instead.\"\"\"
+        nonlocal pos
+        ch = peek()
+        if ch == closing:
+            pos += 1
+            return True
+        if ch != ",":
+            raise ValueError(f"Expected ',' or {closing!r}, got {ch!r}")
+        pos += 1
+        return False
+
+    def skip_rest():
+        \"\"\"Checks the members after the array, so a truncated or malformed document still fails.\"\"\"
+        nonlocal pos
+        while not separator("}"):
+            member = decode()
+            if not isinstance(member, str) or peek() != ":":
+                raise ValueError(f"Expected a member name and ':', got {member!r}")
+            pos += 1
+            decode()
+
+    if peek() != "{":
+        raise ValueError("Expected a JSON object at top level")
+    pos += 1
+    if peek() == "}":
+        return # Empty object: key not present
+    while True:
+        member = decode()
+        if not isinstance(member, str) or peek() != ":":
+            raise ValueError(f"Expected a member name and ':', got {member!r}")
+        pos += 1
+        if member != key:
+            decode() # Skip this member's value
+            if separator("}"):
+                return # Key not present
+            continue
+        if peek() != "[":
+            raise ValueError(f"Expected an array for key {key!r}")
+        pos += 1
+        if peek() == "]":
+            pos += 1
+        else:
+            while True:
+                yield decode()
+                if separator("]"):
+                    break
+        skip_rest()
+        return
+
+
+def fetch_json_items(url, array_key, headers=None, decompress_gzip=False, timeout=60, reuse_output=None):
+    \"\"\"
+    Streaming counterpart of fetch_url for large JSON feeds. The request is made immediately;
+    returns None on a fetch error, otherwise a generator yielding the elements of the top-level
+    array 'array_key' as the response (gunzipped on the fly if decompress_gzip) arrives.
+    HTTP_CACHE handling is as in fetch_url (NOT_MODIFIED when 'reuse_output' was reused); a 200
+    response is copied into the cache while it streams and installed once fully read.
+    \"\"\"
+    effective_headers = {"User-Agent": DEFAULT_USER_AGENT}
+    if headers:
+        effective_headers.update(headers)
+    cache = HTTP_CACHE
+    if cache is not None:
+        effective_headers.update(cache.conditional_headers(url))
+
+    stack = ExitStack()
+    writer = None
+    try:
+        logger.info(f"Fetching (streaming): {url}")
+        stack.enter_context(_host_slot(url))
+        with METRICS.timer("fetch"):
+            resp = get_session().get(url, headers=effective_headers, timeout=timeout, stream=True)
+        METRICS.http(resp.status_code)
+        stack.callback(resp.close)
+        if resp.status_code == 304 and cache is not None:
+            if reuse_output and cache.reuse_output(url, reuse_output):
+                stack.close()
+                logger.info(f"Not modified: {url}; reused previous output for {reuse_output}")
+                _output_reused(reuse_output)
+                return NOT_MODIFIED
+            logger.info(f"Not modified: {url}; using cached response")
+            raw = stack.enter_context(cache.open_body(url))
+        else:
+            resp.raise_for_status()
+            writer = cache.begin(url, resp.headers) if cache is not None else None
+            resp.raw.decode_content = True # strip any Content-Encoding
+            raw = _TeeReader(resp.raw, writer) if writer else resp.raw
+        raw = io.BufferedReader(stack.enter_context(_MeteredReader(raw, "fetch")))
+    except (requests.RequestException, OSError) as e:
+        stack.close()
+        logger.error(f"Error fetching {url}: {e}")
+        METRICS.source_failed()
+        return None
+
+    def items():
+        committed = False
+        try:
+            with stack:
+                if decompress_gzip:
+                    src = io.BufferedReader(stack.enter_context(_MeteredReader(gzip.GzipFile(fileobj=raw), "decompress")))
+                else:
+                    src = raw
+                yield from _metered_items(stream_json_array(io.TextIOWrapper(src, encoding="utf-8"), array_key))
+                if writer:
+                    # Read whatever follows the array so the complete body lands in the cache
+                    while raw.read(1 << 16):
+                        pass
+                    writer.commit()
+                    committed = True
+        finally:
+            if writer and not committed:
+                writer.discard()
+    return items()
+
+
+def normalize_nvd_item(item):
+    \"\"\"Maps one NVD 1.1 CVE_Item to the normalized CVE record.\"\"\"
+    cve = item.get("cve", {})
+    cve_id = cve.get("CVE_data_meta", {}).get("ID")
+    description = ""
+    for d in cve.get("description", {}).get("description_data", []):
+        if d.get("lang") == "en":
+            description = d.get("value", "")
+            break
+
+    impact = item.get("impact", {})
+    cvss_v3_data = impact.get("baseMetricV3", {}).get("cvssV3", {})
+    cvss_v2_data = impact.get("baseMetricV2", {}).get("cvssV2", {})
+    
+    cvss_info = {}
+    if cvss_v3_data and cvss_v3_data.get("baseScore") is not None:
+        cvss_info = {
+            "version": "3.x",
+            "baseScore": cvss_v3_data.get("baseScore"),
+            "severity": cvss_v3_data.get("baseSeverity"),
+            "vectorString": cvss_v3_data.get("vectorString"),
+        }
+    elif cvss_v2_data and cvss_v2_data.get("baseScore") is not None: # Fallback to CVSSv2
+         cvss_info = {
+            "version": "2.0",
+            "baseScore": cvss_v2_data.get("baseScore"),
+            "severity": cvss_v2_data.get("severity"),
+            "vectorString": cvss_v2_data.get("vectorString"),
+        }
+
+    return {
+        "type": "CVE",
+        "source": "NVD",
+        "cve_id": cve_id,
+        "cvss": cvss_info, # Combined CVSS info
+        "published_date": item.get("publishedDate"),
+        "last_modified_date": item.get("lastModifiedDate"),
+        "description": description,
+        "references": [ref.get("url") for ref in cve.get("references", {}).get("reference_data", [])],
+        "cpes": _nvd_cpes(item), # vulnerable CPE 2.3 names from the configurations
+    }
+
+
+def _nvd_cpes(item):
+    \"\"\"Distinct cpe23Uri values marked vulnerable anywhere in an NVD item's configuration nodes (children included).\"\"\"
+    cpes = {}
+    nodes = list(item.get("configurations", {}).get("nodes", []))
+    for node in nodes: # breadth first; children are appended to the list being walked
+        for match in node.get("cpe_match", ()):
+            if match.get("vulnerable") and match.get("cpe23Uri"):
+                cpes.setdefault(match["cpe23Uri"], None)
+        children = node.get("children")
+        if children:
+            nodes.extend(children)
+    return list(cpes)
+
+
+def parse_nvd_json(nvd_data, output_path):
+    \"\"\"
+    Parses NVD JSON data and writes a normalized JSONL file.
+    'nvd_data' is either the decoded feed (dict) or an iterable of CVE_Items, e.g. from fetch_json_items.
+    Each line: { "type": "CVE", "cve_id": ..., "cvss_v3": ..., "published_date": ..., "description": ... }
+    \"\"\"
+    try:
+        logger.info("Parsing NVD JSON feed")
+        if not nvd_data:
+            logger.warning("No NVD data received for parsing.")
+            return
+
+        entries = nvd_data.get("CVE_Items", []) if isinstance(nvd_data, dict) else nvd_data
+        written = 0
+        with tqdm(desc="NVD → JSONL", disable=not SHOW_PROGRESS) as progress, \\
+                open_output(output_path, progress=progress) as out_f:
+            for item in entries:
+                out_f.write_record(normalize_nvd_item(item))
+                written += 1
+        logger.info(f"Wrote parsed CVEs to {output_path}")
+        return written
+    except Exception as e:
+        logger.error(f"Failed parsing NVD JSON: {e}", exc_info=True)
+        METRICS.source_failed()
+
+def iter_stix_objects(path):
+    \"\"\"
+    Yields the objects of a STIX bundle stored at 'path' (zip archive or plain JSON) one at a time,
+    decompressing and decoding incrementally, so memory holds a single object rather than the bundle.
+    \"\"\"
+    with open(path, "rb") as f:
+        is_zip = f.read(2) == b"PK"
+    if is_zip:
+        with zipfile.ZipFile(path) as z:
+            json_fnames = [f for f in z.namelist() if f.endswith(".json")]
+            if not json_fnames:
+                raise ValueError("No JSON file found inside STIX ZIP")
+            with z.open(json_fnames[0]) as json_file, _MeteredReader(json_file, "decompress") as metered:
+                yield from stream_json_array(io.TextIOWrapper(io.BufferedReader(metered), encoding="utf-8"), "objects")
+    else:
+        with open(path, encoding="utf-8") as json_file:
+            yield from stream_json_array(json_file, "objects")
+
+
+def _stix_external_id(obj):
+    for ref in obj.get("external_references", []):
+        if ref.get("source_name") in ("mitre-attack", "mitre-ics-attack"):
+            return ref.get("external_id", "")
+    return ""
+
+
+class AttackRelationshipIndex:
+    \"\"\"
+    Compact side index of ATT&CK relationships, filled in the same pass that extracts techniques.
+    Only STIX id -> (external id, name) for the object types involved and the relevant relationship
+    triples are kept; write() resolves them to one JSONL line per technique:
+    { "technique_id": ..., "mitigations": [...], "groups": [...], "software": [...] }
+    \"\"\"
+    NAMED_TYPES = ("attack-pattern", "course-of-action", "intrusion-set", "malware", "tool")
+
+    def __init__(self):
+        self.names = {}
+        self.relationships = []
+
+    def add(self, obj):
+        obj_type = obj.get("type")
+        if obj_type in self.NAMED_TYPES:
+            self.names[obj.get("id")] = (_stix_external_id(obj), obj.get("name", ""))
+        elif obj_type == "relationship" and not obj.get("revoked"):
+            if obj.get("relationship_type") in ("mitigates", "uses") and str(obj.get("target_ref", "")).startswith("attack-pattern--"):
+                self.relationships.append((obj.get("source_ref"), obj.get("target_ref")))
+
+    def write(self, path):
+        by_technique = {}
+        for source_ref, target_ref in self.relationships:
+            technique = self.names.get(target_ref)
+            related = self.names.get(source_ref)
+            if not technique or not technique[0] or not related:
+                continue
+            source_type = source_ref.split("--", 1)[0]
+            if source_type == "course-of-action":
+                kind = "mitigations"
+            elif source_type == "intrusion-set":
+                kind = "groups"
+            else:
+                kind = "software"
+            entry = by_technique.setdefault(technique[0], {"mitigations": [], "groups": [], "software": []})
+            entry[kind].append({"id": related[0], "name": related[1]})
+        with _open_atomic(path) as out_f:
+            for technique_id in sorted(by_technique):
+                out_f.write(json.dumps({"technique_id": technique_id, **by_technique[technique_id]}) + "\\n")
+        logger.info(f"Wrote ATT&CK relationships for {len(by_technique)} techniques to {path}")
+
+
+_ATTACK_SOURCE_NAMES = ("mitre-attack", "mitre-ics-attack") # external_references / kill chains of ATT&CK proper
+
+
+def normalize_attack_pattern(obj, framework_name):
+    \"\"\"Maps one STIX attack-pattern object to the normalized ATT&CK technique record.\"\"\"
+    tech_id = ""
+    # Find external ID (Txxxx)
+    for ref in obj.get("external_references", []):
+        if ref.get("source_name") in _ATTACK_SOURCE_NAMES:
+            tech_id = ref.get("external_id", "")
+            break
+
+    return {
+        "type": "ATT&CK",
+        "source": "MITRE",
+        "framework": framework_name,
+        "technique_id": tech_id,
+        "name": obj.get("name", ""),
+        "description": obj.get("description", "").strip(),
+        "tactics": [phase.get("phase_name") for phase in obj.get("kill_chain_phases", [])
+                    if phase.get("kill_chain_name") in _ATTACK_SOURCE_NAMES],
+        "platforms": obj.get("x_mitre_platforms", []),
+        "data_sources": obj.get("x_mitre_data_sources", []),
+        "created_date": obj.get("created"),
+        "modified_date": obj.get("modified"),
+    }
+
+
+def parse_mitre_stix(stix_data, output_path, framework_name, relationships_path=None):
+    \"\"\"
+    Parses MITRE ATT&CK STIX objects and writes a JSONL file containing techniques.
+    { "type": "ATT&CK", "framework": "enterprise/ics", "technique_id": ..., "name": ..., "description": ..., "tactics": [...] }
+    'stix_data' is a file path (streamed, see iter_stix_objects), raw bytes or a parsed bundle. With
+    'relationships_path', mitigations, groups and software per technique are captured in the same pass.
+    \"\"\"
+    try:
+        from io import BytesIO
+        
+        logger.info(f"Parsing MITRE STIX feed for {framework_name}")
+        if not stix_data:
+             logger.warning(f"No MITRE STIX data received for {framework_name}.")
+             return
+
+        # If stix_data is bytes and starts with PK (zip signature), decompress. Otherwise assume parsed JSON.
+        # The fetch_url now handles JSON parsing, so stix_data should be a dict.
+        # The example URL for MITRE includes .zip, so fetch_url needs to handle raw bytes for zip.
+        # Let's assume fetch_url(..., is_json=False) was used for zip files.
+        
+        objects = None
+        parsed_stix_data = None
+        if isinstance(stix_data, (str, os.PathLike)): # Spooled download: stream objects off disk
+            logger.info(f"Streaming MITRE STIX objects for {framework_name} from {stix_data}")
+            objects = _metered_items(iter_stix_objects(stix_data))
+        elif isinstance(stix_data, bytes): # If raw bytes from a ZIP file
+            if stix_data[:2] == b"PK":
+                logger.info(f"Detected ZIP format for MITRE STIX ({framework_name}); decompressing")
+                with zipfile.ZipFile(BytesIO(stix_data)) as z:
+                    json_fnames = [f for f in z.namelist() if f.endswith(".json")]
+                    if not json_fnames:
+                        raise ValueError("No JSON file found inside STIX ZIP")
+                    with z.open(json_fnames[0]) as json_file, METRICS.timer("decode"):
+                        parsed_stix_data = json.load(json_file)
+            else: # Not a zip, try to decode as JSON directly if it's bytes
+                try:
+                    with METRICS.timer("decode"):
+                        parsed_stix_data = json.loads(stix_data.decode('utf-8'))
+                except Exception as e_decode:
+                    logger.error(f"STIX data for {framework_name} is bytes but not ZIP or valid JSON: {e_decode}")
+                    METRICS.source_failed()
+                    return
+        elif isinstance(stix_data, dict): # Already parsed JSON
+            parsed_stix_data = stix_data
+        else:
+            logger.error(f"Unexpected data type for MITRE STIX ({framework_name}): {type(stix_data)}")
+            METRICS.source_failed()
+            return
+
+        if objects is None:
+            if not parsed_stix_data:
+                logger.error(f"Failed to obtain parsed JSON from STIX data for {framework_name}.")
+                METRICS.source_failed()
+                return
+            objects = parsed_stix_data.get("objects", [])
+
+        relationships = AttackRelationshipIndex() if relationships_path else None
+        written = 0
+        with tqdm(desc=f"ATT&CK {framework_name} → JSONL", disable=not SHOW_PROGRESS) as progress, \\
+                open_output(output_path, progress=progress) as out_f:
+            for obj in objects:
+                if relationships is not None:
+                    relationships.add(obj)
+                if obj.get("type") == "attack-pattern": # Corrected hyphen
+                    out_f.write_record(normalize_attack_pattern(obj, framework_name))
+                    written += 1
+        logger.info(f"Wrote parsed ATT&CK {framework_name} techniques to {output_path}")
+        if relationships is not None:
+            relationships.write(relationships_path)
+        return written
+    except Exception as e:
+        logger.error(f"Failed parsing MITRE STIX for {framework_name}: {e}", exc_info=True)
+        METRICS.source_failed()
+
+
+def normalize_cisa_entry(entry, alert_type_name):
+    \"\"\"Maps one feedparser RSS entry to the normalized CISA record of type 'alert_type_name'.\"\"\"
+    title = entry.get("title", "")
+
+    published_date_parsed = entry.get("published_parsed")
+    published_date_iso = ""
+    if published_date_parsed:
+        try:
+            # Create datetime object, assume UTC if not specified by feedparser
+            dt_obj = datetime(*published_date_parsed[:6])
+            # If feedparser doesn't provide tzinfo, assume UTC for ISO formatting consistency
+            if dt_obj.tzinfo is None:
+                dt_obj = dt_obj.replace(tzinfo=timezone.utc)
+            published_date_iso = dt_obj.isoformat()
+        except Exception as e_date:
+            logger.warning(f"Could not parse date for RSS entry '{title}': {e_date}. Using raw: {entry.get('published')}")
+            published_date_iso = entry.get("published", "") # Fallback to raw string
+    else:
+        published_date_iso = entry.get("published", "")
+
+    # Basic HTML stripping (consider BeautifulSoup for complex HTML)
+    # summary = re.sub('<[^<]+?>', '', summary).strip()
+    return {
+        "type": alert_type_name, # e.g. "CISA_ALERT", "CISA_ACTIVITY"
+        "source": "CISA",
+        "title": title,
+        "link": entry.get("link", ""),
+        "published_date": published_date_iso,
+        "summary": entry.get("summary", "").strip(),
+    }
+
+
+def parse_cisa_rss(rss_url, output_path, alert_type_name, timeout=60):
+    \"\"\"
+    Parses a CISA RSS feed and writes a normalized JSONL file.
+    Each line: { "type": alert_type_name, "title": ..., "link": ..., "published_date": ..., "summary": ... }
+    \"\"\"
+    try:
+        logger.info(f"Fetching and parsing CISA RSS feed: {rss_url} as {alert_type_name}")
+        # Fetch through fetch_url rather than letting feedparser fetch, so the request honours
+        # the per-source timeout (feedparser's own fetcher has none) and the per-host limit.
+        rss_bytes = fetch_url(rss_url, timeout=timeout, is_json=False, reuse_output=output_path)
+        if rss_bytes is NOT_MODIFIED:
+            return
+        if not rss_bytes:
+            logger.error(f"No RSS data received from {rss_url}. Skipping.")
+            METRICS.source_failed()
+            return
+        if _payload_unchanged(output_path, hashlib.sha256(rss_bytes).hexdigest()):
+            return
+        with METRICS.timer("decode"):
+            feed_data = feedparser.parse(rss_bytes)
+        METRICS.add("decode", records_in=len(feed_data.entries))
+        
+        if feed_data.bozo: # Check for errors during parsing
+            bozo_exception = feed_data.bozo_exception
+            logger.warning(f"Warning parsing RSS feed {rss_url} (might be malformed or fetch error): {bozo_exception}")
+            # Continue if entries exist, otherwise return
+            if not feed_data.entries:
+                 logger.error(f"No entries found and bozo flag set for {rss_url}. Skipping.")
+                 METRICS.source_failed()
+                 return
+
+        written = 0
+        with tqdm(total=len(feed_data.entries), desc=f"{alert_type_name} → JSONL", disable=not SHOW_PROGRESS) as progress, \\
+                open_output(output_path, progress=progress) as out_f:
+            for entry in feed_data.entries:
+                out_f.write_record(normalize_cisa_entry(entry, alert_type_name))
+                written += 1
+        logger.info(f"Wrote parsed {alert_type_name} to {output_path}")
+        _record_cached_output(rss_url, output_path, written)
+        return written
+    except Exception as e:
+        logger.error(f"Failed parsing CISA RSS feed {rss_url}: {e}", exc_info=True)
+        METRICS.source_failed()
+
+
+def normalize_msrc_vuln(vuln):
+    \"\"\"Maps one MSRC API vulnerability object to the normalized MSRC_BULLETIN record.\"\"\"
+    cve_number = vuln.get("cveNumber")
+    release_date = vuln.get("releaseDate")
+    name = vuln.get("vulnerabilityName") # This is often the title
+    description = vuln.get("description", {}).get("value","") # Description seems to be in a nested structure for some CVRF versions
+
+    # Extract CVSS - MSRC provides a list, pick the most relevant (e.g., highest base score or specific provider)
+    cvss_info = {}
+    best_cvss = None
+    best_score = 0
+    for cvss_set in vuln.get("cvssScoreSets", []):
+        score = cvss_set.get("baseScore")
+        if score is not None: # Ensure there's a base score
+            if best_cvss is None or score > best_score:
+                 # Prefer CVSS v3 if available and provider is Microsoft
+                vector = cvss_set.get("vector", "")
+                if "cvssV3" in vector.lower() or "CVSS:3" in vector:
+                    best_cvss, best_score = cvss_set, score
+                elif best_cvss is None: # Fallback if no V3 found yet
+                    best_cvss, best_score = cvss_set, score
+
+    if best_cvss:
+        cvss_info = {
+            "baseScore": best_score,
+            "severity": best_cvss.get("severity"), # MSRC CVSS severity might differ from NVD's interpretation
+            "vectorString": best_cvss.get("vector"),
+        }
+
+    affected_products_summary = [
+        f"{prod.get('productFamily', 'Unknown Family')} - {prod.get('productName', 'Unknown Product')}"
+        for prod in vuln.get("affectedProducts", [])
+    ]
+
+    # Consolidate tags/flags
+    exploited_status = vuln.get("exploited", "Unknown") # e.g., "Yes", "No", "Yes - Publicly Disclosed"
+    publicly_disclosed = vuln.get("publiclyDisclosed", "Unknown")
+
+    return {
+        "type": "MSRC_BULLETIN",
+        "source": "Microsoft",
+        "cve_id": cve_number, # MSRC bulletins are usually tied to a CVE
+        "title": name,
+        "description": description.strip(),
+        "published_date": release_date,
+        "cvss": cvss_info,
+        "affected_products": affected_products_summary, # List of strings
+        "exploited_status": exploited_status,
+        "publicly_disclosed": publicly_disclosed,
+        "msrc_url": f"https://msrc.microsoft.com/update-guide/vulnerability/{cve_number}" if cve_number else ""
+    }
+
+
+def _put_unless_stopped(q, item, stop):
+    \"\"\"Blocking put on a bounded queue that gives up once 'stop' is set (the consumer went away).\"\"\"
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce_msrc_pages(url, headers, timeout, pages, stop, page_num=1):
+    \"\"\"
+    Follows @odata.nextLink and puts (page_num, vulns, next_link) on 'pages'; ends with None on
+    success or the exception that stopped it. Runs on its own thread so the next page is in flight
+    while the consumer writes the previous one.
+    \"\"\"
+    session = get_session()
+    try:
+        while url and not stop.is_set():
+            logger.info(f"Fetching MSRC page: {page_num} from {url.split('?')[0]}...") # Log base URL to avoid logging full query if sensitive
+            frame = METRICS.begin()
+            resp = request_with_backoff(session, url, headers=headers, timeout=timeout)
+            # Overlaps the consumer's "wait", which is what the page costs the source's total
+            METRICS.add("fetch", seconds=METRICS.end(frame), nbytes=len(resp.content), background=True)
+            frame = METRICS.begin()
+            data = resp.json()
+            vulns = data.get("value", [])
+            METRICS.add("decode", seconds=METRICS.end(frame), records_in=len(vulns), background=True)
+            # MSRC API uses @odata.nextLink for pagination
+            url = data.get("@odata.nextLink")
+            if not _put_unless_stopped(pages, (page_num, vulns, url), stop):
+                return
+            page_num += 1
+        logger.info("No more MSRC pages to fetch.")
+        _put_unless_stopped(pages, None, stop)
+    except Exception as e:
+        _put_unless_stopped(pages, e, stop)
+
+
+def parse_msrc_api(output_path, lookback_days=1, timeout=60):
+    \"\"\"
+    Fetches recent MSRC vulnerabilities and writes a normalized JSONL file.
+    Filters vulnerabilities released in the last 'lookback_days'.
+    Pages are fetched on a background thread over the keep-alive session while the previous page
+    is normalized and written, so at most MSRC_PAGE_PREFETCH pages are held in memory. Throttling
+    and transient errors are retried by request_with_backoff; if a page still fails, what was
+    written so far is published and the CHECKPOINT keeps the next page's link, so a --resume run
+    continues from there instead of page 1.
+    \"\"\"
+    base_url = MSRC_API_URL
+    
+    # Calculate the start date for filtering
+    start_date = datetime.now(timezone.utc) - timedelta(days=lookback_days)
+    start_date_str = start_date.strftime("%Y-%m-%dT%H:%M:%SZ") # MSRC API expects ISO 8601 format
+
+    # OData filter for releaseDate. Using 'gt' (greater than) for recent items.
+    # Or 'ge' (greater than or equal) if precise boundary is needed.
+    # For a daily script, 'gt' the start of 'lookback_days' ago is fine.
+    query_filter = f"$filter=releaseDate gt {start_date_str}"
+    
+    current_url = f"{base_url}?{query_filter}"
+    api_key = os.getenv("MSRC_API_KEY") # Optional: MSRC API may work without a key for public data but is rate-limited.
+    headers = {"Accept": "application/json"}
+    if api_key:
+        headers["api-key"] = api_key
+        logger.info("Using MSRC_API_KEY for MSRC API.")
+    else:
+        logger.info("No MSRC_API_KEY found, accessing MSRC API without authentication (may be rate-limited).")
+
+    page_num = 1
+    written = 0
+    resume_offset = None
+    resume = CHECKPOINT.pagination("msrc") if CHECKPOINT is not None else None
+    partial_path = _partial_path(output_path)
+    if resume and os.path.exists(partial_path) and os.path.getsize(partial_path) >= resume["offset"]:
+        # Same query as the interrupted run, picked up at the first page it had not written
+        start_date_str = resume["start"]
+        current_url = resume["next_link"]
+        page_num = resume["pages"] + 1
+        written = resume["written"]
+        resume_offset = resume["offset"]
+        logger.info(f"Resuming MSRC at page {page_num} ({written} vulnerabilities already written)")
+    elif CHECKPOINT is not None:
+        CHECKPOINT.save_pagination("msrc", None)
+
+    logger.info(f"Fetching MSRC vulnerabilities released after {start_date_str}")
+
+    pages = queue.Queue(maxsize=MSRC_PAGE_PREFETCH)
+    stop = threading.Event()
+    # Run in a copy of this context so the producer's fetch/decode metrics are attributed to this source
+    producer = threading.Thread(target=contextvars.copy_context().run,
+                                args=(_produce_msrc_pages, current_url, headers, timeout, pages, stop, page_num),
+                                name="msrc-pages", daemon=True)
+    producer.start()
+
+    out_f = None
+    failed = False
+    progress = tqdm(desc="MSRC → JSONL", unit="vuln", initial=written, disable=not SHOW_PROGRESS)
+    try:
+        with ExitStack() as output:
+            if resume_offset is not None:
+                out_f = output.enter_context(open_output(output_path, resume_offset=resume_offset, keep_partial=True,
+                                                         progress=progress))
+            while True:
+                with METRICS.timer("wait"):
+                    item = pages.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    logger.error(f"Error fetching MSRC data from {base_url}: {item}")
+                    METRICS.source_failed()
+                    failed = True
+                    if out_f is not None:
+                        out_f.incomplete = True
+                    break
+                page_num, vulns, next_link = item
+                if vulns and out_f is None:
+                    # Created on the first vulnerability, so an empty period leaves no file behind
+                    out_f = output.enter_context(open_output(output_path, keep_partial=True, progress=progress))
+                for vuln in vulns:
+                    out_f.write_record(normalize_msrc_vuln(vuln))
+                written += len(vulns)
+                if next_link and out_f is not None and CHECKPOINT is not None:
+                    CHECKPOINT.save_pagination("msrc", {"start": start_date_str, "next_link": next_link,
+                                                        "pages": page_num, "written": written,
+                                                        "offset": out_f.sync()})
+    except Exception as e:
+        logger.error(f"Failed writing MSRC data to {output_path}: {e}", exc_info=True)
+        METRICS.source_failed()
+        return None
+    finally:
+        stop.set()
+        progress.close()
+
+    if failed:
+        logger.warning("MSRC pagination stopped early; rerun with --resume to continue from the last written page.")
+    if not written:
+        if not failed:
+            if CHECKPOINT is not None:
+                CHECKPOINT.complete("msrc")
+            logger.info(f"No MSRC vulnerabilities found for the period after {start_date_str}.")
+        return None
+    logger.info(f"Wrote parsed MSRC vulnerabilities to {output_path}")
+    return written
+
+
+def source_output_path(output_dir, source, today, kind=None):
+    \"\"\"Path of a source's output for 'today'; 'kind' (e.g. "delta") selects a derived file.\"\"\"
+    prefix = SOURCE_OUTPUT_PREFIXES[source]
+    if kind:
+        prefix = f"{prefix}_{kind}"
+    return os.path.join(output_dir, f"{prefix}_{today}.jsonl")
+
+
+def write_delta(source, snapshot_path, output_dir, today, state_dir):
+    \"\"\"
+    Compares a source's fresh snapshot with the per-record state of previous runs and writes
+    <prefix>_delta_YYYYMMDD.jsonl with only new or changed records (lines copied verbatim) and,
+    for snapshot feeds, <prefix>_tombstones_YYYYMMDD.jsonl naming records that disappeared.
+    The state (key -> change marker) is kept in state_dir/<source>.json.
+    \"\"\"
+    key_field, marker_field, emits_tombstones = DELTA_KEYS[source]
+    state_path = os.path.join(state_dir, f"{source}.json")
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            previous = json.load(f).get("records", {})
+    except FileNotFoundError:
+        previous = {}
+
+    current = {}
+    new_count = changed_count = keyless_count = 0
+    delta_path = source_output_path(output_dir, source, today, "delta")
+    with open(snapshot_path, encoding="utf-8") as in_f, _open_atomic(delta_path) as delta_f:
+        for line in in_f:
+            record = json.loads(line)
+            key = record.get(key_field)
+            if marker_field and key:
+                marker = record.get(marker_field)
+            else:
+                marker = hashlib.sha1(line.encode("utf-8")).hexdigest()
+            if not key:
+                # No identity of its own; any change to it makes a new record
+                key = DELTA_KEYLESS_PREFIX + marker
+                keyless_count += 1
+            current[key] = marker
+            if key not in previous:
+                new_count += 1
+            elif previous[key] != marker:
+                changed_count += 1
+            else:
+                continue
+            delta_f.write(line)
+
+    removed = []
+    if emits_tombstones:
+        removed = [key for key in previous if key not in current and not key.startswith(DELTA_KEYLESS_PREFIX)]
+        with _open_atomic(source_output_path(output_dir, source, today, "tombstones")) as tomb_f:
+            for key in removed:
+                tomb_f.write(json.dumps({"type": "TOMBSTONE", "source_file": os.path.basename(snapshot_path),
+                                         key_field: key, "last_marker": previous[key]}) + "\\n")
+    else:
+        # Rolling-window feed: remember records that merely left the window
+        current = {**previous, **current}
+
+    os.makedirs(state_dir, exist_ok=True)
+    with _open_atomic(state_path) as f:
+        json.dump({"updated": datetime.now(timezone.utc).isoformat(), "records": current}, f)
+    logger.info(f"Delta for {source}: {new_count} new, {changed_count} changed, {len(removed)} removed "
+                f"({keyless_count} without a {key_field}) -> {delta_path}")
+
+
+def _is_fresh(path, started):
+    \"\"\"True if 'path' was written since 'started' (a time.time() value), allowing for coarse filesystem timestamps.\"\"\"
+    return os.path.exists(path) and os.path.getmtime(path) >= started - 1
+
+
+def _with_delta(source, job, output_dir, today, state_dir):
+    \"\"\"Wraps an ingest job so the delta is computed right after its snapshot is written.\"\"\"
+    def run():
+        started = time.time()
+        job()
+        snapshot_path = source_output_path(output_dir, source, today)
+        # Only diff a snapshot produced by this run
+        if _is_fresh(snapshot_path, started):
+            with METRICS.timer("delta"):
+                write_delta(source, snapshot_path, output_dir, today, state_dir)
+        else:
+            logger.warning(f"No fresh {source} snapshot; delta skipped and state left unchanged.")
+    return run
+
+
+# Indexed store (--store): table per record type -> (key columns, other indexed/filter columns, full-text columns)
+STORE_TABLES = {
+    "cves": (("cve_id",), ("published_date", "last_modified_date", "cvss_score", "cvss_severity"),
+             ("cve_id", "description")),
+    "attack_techniques": (("framework", "technique_id"), ("name", "modified_date"),
+                          ("technique_id", "name", "description")),
+    "cisa_items": (("type", "link"), ("published_date", "title"),
+                   ("title", "summary")),
+    "msrc_bulletins": (("cve_id",), ("published_date", "cvss_score", "exploited_status", "publicly_disclosed"),
+                       ("cve_id", "title", "description")),
+}
+STORE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS cves_published ON cves(published_date)",
+    "CREATE INDEX IF NOT EXISTS cves_modified ON cves(last_modified_date)",
+    "CREATE INDEX IF NOT EXISTS cves_score ON cves(cvss_score)",
+    "CREATE INDEX IF NOT EXISTS attack_modified ON attack_techniques(modified_date)",
+    "CREATE INDEX IF NOT EXISTS cisa_published ON cisa_items(type, published_date)",
+    "CREATE INDEX IF NOT EXISTS msrc_published ON msrc_bulletins(published_date)",
+    "CREATE INDEX IF NOT EXISTS msrc_score ON msrc_bulletins(cvss_score)",
+]
+SOURCE_STORE_TABLES = {
+    "nvd": "cves",
+    "mitre_enterprise": "attack_techniques",
+    "mitre_ics": "attack_techniques",
+    "cisa_alerts": "cisa_items",
+    "cisa_activity": "cisa_items",
+    "msrc": "msrc_bulletins",
+}
+# Dashboard endpoint (services/api.ts) -> (table, (filter column, value) or None, ORDER BY)
+STORE_ENDPOINTS = {
+    "/nvd": ("cves", None, "published_date DESC"),
+    "/mitre/enterprise": ("attack_techniques", ("framework", "enterprise"), "technique_id"),
+    "/mitre/ics": ("attack_techniques", ("framework", "ics"), "technique_id"),
+    "/cisa/alerts": ("cisa_items", ("type", "CISA_ALERT"), "published_date DESC"),
+    "/cisa/activity": ("cisa_items", ("type", "CISA_ACTIVITY"), "published_date DESC"),
+    "/msrc": ("msrc_bulletins", None, "published_date DESC"),
+}
+STORE_MAX_PAGE_SIZE = 500
+# Tables listed newest first get rowids that follow published_date: the date's digits (YYYYMMDDhhmmss)
+# times STORE_ROWID_SLOT plus a counter for records of the same second; undated records sort last.
+# The full-text index returns matches in rowid order, so a search pages straight off it, newest
+# first, instead of sorting every match.
+STORE_DATE_ROWID_TABLES = ("cves", "cisa_items", "msrc_bulletins")
+STORE_ROWID_SLOT = 1 << 16
+STORE_SEARCH_MAX_RESULTS = 10000 # matches a search counts and pages through
+_STORE_DATE_RE = re.compile(r"(\\d{4})-(\\d{2})-(\\d{2})(?:[T ](\\d{2}):(\\d{2})(?::(\\d{2}))?)?")
+
+
+def _store_columns(table):
+    key_cols, indexed_cols, text_cols = STORE_TABLES[table]
+    return list(dict.fromkeys(key_cols + indexed_cols + text_cols))
+
+
+def _store_value(record, column):
+    if column == "cvss_score":
+        return (record.get("cvss") or {}).get("baseScore")
+    if column == "cvss_severity":
+        return (record.get("cvss") or {}).get("severity")
+    value = record.get(column)
+    return value.strip() if isinstance(value, str) else value
+
+
+def _date_rowid_slot(value):
+    \"\"\"First rowid of the STORE_ROWID_SLOT block for a published_date (0 if it is not an ISO date).\"\"\"
+    match = _STORE_DATE_RE.match(value or "")
+    if not match:
+        return 0
+    return int("".join(part or "00" for part in match.groups())) * STORE_ROWID_SLOT
+
+
+def _fts_match(q):
+    \"\"\"Turns free text into an FTS5 query: every term must match; terms are quoted so punctuation is literal.\"\"\"
+    terms = q.split()
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+# Inverted product index, kept in the store next to the record tables: one row per (product, vendor,
+# CVE, source) from NVD CPEs and MSRC affected products, so product lookups are index probes.
+PRODUCT_INDEX_SOURCES = ("nvd", "msrc")
+PRODUCT_INDEX_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS product_cves (product TEXT NOT NULL, vendor TEXT NOT NULL, cve_id TEXT NOT NULL, "
+    "source TEXT NOT NULL, versions TEXT, published_date TEXT, PRIMARY KEY (product, vendor, cve_id, source)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS product_cves_date ON product_cves(product, published_date)",
+    "CREATE INDEX IF NOT EXISTS product_cves_cve ON product_cves(cve_id, source)",
+]
+_CPE_SEPARATOR_RE = re.compile(r"(?<!\\\\):")
+_PRODUCT_TOKEN_RE = re.compile(r"[^a-z0-9]+")
+# MSRC product names carry version, edition and platform qualifiers that CPE product names leave out
+_MSRC_QUALIFIER_RE = re.compile(r"\\s+(?:version\\s+\\S+|for\\s+.*|\\(.*?\\)|service\\s+pack\\s+\\d+|sp\\d+)", re.IGNORECASE)
+
+
+def _product_token(name):
+    \"\"\"Normalized product/vendor name: lower-case alphanumeric words joined by underscores, as in CPE names.\"\"\"
+    return _PRODUCT_TOKEN_RE.sub("_", name.lower()).strip("_")
+
+
+def parse_cpe(cpe):
+    \"\"\"(vendor, product, version) of a CPE 2.3 name, version None for "*" / "-"; None if 'cpe' is not one.\"\"\"
+    parts = _CPE_SEPARATOR_RE.split(cpe)
+    if len(parts) < 6 or parts[:2] != ["cpe", "2.3"]:
+        return None
+    vendor, product, version = (part.replace("\\\\", "") for part in parts[3:6])
+    if not vendor or not product:
+        return None
+    return _product_token(vendor), _product_token(product), None if version in ("*", "-", "") else version
+
+
+def parse_msrc_product(name):
+    \"\"\"(vendor, product, version) of an MSRC affected_products entry ("<family> - <product>"); None if unknown.\"\"\"
+    family, separator, product = name.partition(" - ")
+    product = product if separator else family
+    if not product or product.startswith("Unknown"):
+        return None
+    version = re.search(r"\\bversion\\s+(\\S+)", product, re.IGNORECASE)
+    base = _MSRC_QUALIFIER_RE.sub("", product)
+    if base.lower().startswith("microsoft "):
+        base = base[len("microsoft "):]
+    return "microsoft", _product_token(base), version.group(1) if version else None
+
+
+def product_entries(source, record):
+    \"\"\"[(vendor, product, [versions])] named by an NVD or MSRC record, one entry per vendor/product.\"\"\"
+    if source == "nvd":
+        parsed = (parse_cpe(cpe) for cpe in record.get("cpes") or [])
+    else:
+        parsed = (parse_msrc_product(name) for name in record.get("affected_products") or [])
+    products = {}
+    for entry in parsed:
+        if entry:
+            versions = products.setdefault(entry[:2], [])
+            if entry[2] and entry[2] not in versions:
+                versions.append(entry[2])
+    return [(vendor, product, versions) for (vendor, product), versions in products.items()]
+
+
+def _inventory_key(entry):
+    \"\"\"(vendor or None, product) for an inventory line: a CPE 2.3 name, "vendor:product" or a product name.\"\"\"
+    entry = entry.strip()
+    if entry.startswith("cpe:"):
+        parsed = parse_cpe(entry)
+        return parsed[:2] if parsed else (None, _product_token(entry))
+    vendor, separator, product = entry.partition(":")
+    if separator:
+        return _product_token(vendor), _product_token(product)
+    parsed = parse_msrc_product(entry)
+    return (None, parsed[1]) if parsed else (None, _product_token(entry))
+
+
+class IntelStore:
+    \"\"\"
+    SQLite store of the normalized records, kept up to date by each ingest run. Every record type
+    gets its own table with B-tree indexes on ids, dates and CVSS score plus an FTS5 index over its
+    text fields, so query() can answer the dashboard's paginated, searchable endpoints without
+    scanning JSONL. The full normalized record is kept as JSON and returned as-is. NVD and MSRC
+    records also feed the product_cves index behind cves_for_product() and match_inventory().
+    \"\"\"
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA cache_size=-65536") # 64 MB page cache for bulk upserts
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.conn:
+            for table, (key_cols, _, text_cols) in STORE_TABLES.items():
+                columns = ", ".join(f"{col} {'REAL' if col == 'cvss_score' else 'TEXT'}" for col in _store_columns(table))
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns}, record TEXT NOT NULL, "
+                                  f"PRIMARY KEY ({', '.join(key_cols)}))")
+                fts_cols = ", ".join(text_cols)
+                new_cols = ", ".join(f"new.{col}" for col in text_cols)
+                old_cols = ", ".join(f"old.{col}" for col in text_cols)
+                # External-content FTS table, kept in sync by triggers
+                self.conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({fts_cols}, "
+                                  f"content='{table}', content_rowid='rowid')")
+                self.conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {table} BEGIN "
+                                  f"INSERT INTO {table}_fts(rowid, {fts_cols}) VALUES (new.rowid, {new_cols}); END")
+                self.conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {table} BEGIN "
+                                  f"INSERT INTO {table}_fts({table}_fts, rowid, {fts_cols}) VALUES ('delete', old.rowid, {old_cols}); END")
+                self.conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE ON {table} BEGIN "
+                                  f"INSERT INTO {table}_fts({table}_fts, rowid, {fts_cols}) VALUES ('delete', old.rowid, {old_cols}); "
+                                  f"INSERT INTO {table}_fts(rowid, {fts_cols}) VALUES (new.rowid, {new_cols}); END")
+            for statement in STORE_INDEXES + PRODUCT_INDEX_SCHEMA:
+                self.conn.execute(statement)
+
+    def load_jsonl(self, source, path, batch_size=5000):
+        \"\"\"
+        Upserts the records of a source's JSONL output. Rows whose stored record is identical are
+        left untouched, so re-loading an unchanged snapshot does not churn the indexes.
+        Returns the number of records read.
+        \"\"\"
+        table = SOURCE_STORE_TABLES[source]
+        key_cols = STORE_TABLES[table][0]
+        columns = _store_columns(table)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in columns + ["record"] if col not in key_cols)
+        insert_cols = columns + ["record"]
+        date_rowids = table in STORE_DATE_ROWID_TABLES
+        if date_rowids:
+            # A record whose published_date changed moves to a rowid of its new date
+            updates += ", rowid = CASE WHEN published_date IS excluded.published_date THEN rowid ELSE excluded.rowid END"
+            insert_cols = columns + ["rowid", "record"]
+        sql = (f"INSERT INTO {table} ({', '.join(insert_cols)}) VALUES ({', '.join('?' * len(insert_cols))}) "
+               f"ON CONFLICT ({', '.join(key_cols)}) DO UPDATE SET {updates} WHERE record != excluded.record")
+        indexes_products = source in PRODUCT_INDEX_SOURCES
+        next_rowids = {}
+        read = 0
+        batch = []
+        records = []
+        with open(path, encoding="utf-8") as in_f, self.conn:
+            for line in in_f:
+                record = json.loads(line)
+                read += 1
+                if any(not record.get(col) for col in key_cols):
+                    continue # No identity to upsert on
+                row = [_store_value(record, col) for col in columns]
+                if date_rowids:
+                    row.append(self._next_rowid(table, record.get("published_date"), next_rowids))
+                row.append(line.rstrip("\\n"))
+                batch.append(row)
+                records.append(record)
+                if len(batch) >= batch_size:
+                    self._upsert(table, sql, batch, records if indexes_products else None, source)
+                    batch, records = [], []
+            if batch:
+                self._upsert(table, sql, batch, records if indexes_products else None, source)
+        logger.info(f"Loaded {read} {source} records from {path} into {self.path}:{table}")
+        return read
+
+    def _next_rowid(self, table, published_date, next_rowids):
+        \"\"\"Next free rowid for a record of 'published_date' in a STORE_DATE_ROWID_TABLES table.\"\"\"
+        slot = _date_rowid_slot(published_date)
+        rowid = next_rowids.get(slot)
+        if rowid is None:
+            last = self.conn.execute(f"SELECT MAX(rowid) FROM {table} WHERE rowid >= ? AND rowid < ?",
+                                     (slot, slot + STORE_ROWID_SLOT)).fetchone()[0]
+            rowid = slot if last is None else last + 1
+        if rowid >= slot + STORE_ROWID_SLOT:
+            raise ValueError(f"More than {STORE_ROWID_SLOT} {table} records published at {published_date!r}")
+        next_rowids[slot] = rowid + 1
+        return rowid
+
+    def _upsert(self, table, sql, batch, records, source):
+        if records is None:
+            self.conn.executemany(sql, batch)
+            return
+        # Product-indexed tables are keyed by cve_id (the first column). Records identical to the
+        # stored ones are dropped up front, so an unchanged snapshot leaves product_cves untouched too.
+        stored = {}
+        for start in range(0, len(batch), 500):
+            chunk = [row[0] for row in batch[start:start + 500]]
+            stored.update(self.conn.execute(
+                f"SELECT cve_id, record FROM {table} WHERE cve_id IN ({', '.join('?' * len(chunk))})", chunk))
+        changed = [i for i, row in enumerate(batch) if stored.get(row[0]) != row[-1]]
+        if not changed:
+            return
+        self.conn.executemany(sql, [batch[i] for i in changed])
+        # Replace the changed records' product rows so products dropped from a record leave the index too
+        self.conn.executemany("DELETE FROM product_cves WHERE cve_id = ? AND source = ?",
+                              [(batch[i][0], source) for i in changed])
+        self.conn.executemany("INSERT OR REPLACE INTO product_cves VALUES (?, ?, ?, ?, ?, ?)",
+                              [(product, vendor, record["cve_id"], source, ",".join(versions), record.get("published_date"))
+                               for record in (records[i] for i in changed)
+                               for vendor, product, versions in product_entries(source, record)])
+
+    def cves_for_product(self, name, since=None, limit=100):
+        \"\"\"
+        CVEs affecting a product, newest first: [{"cve_id", "source", "vendor", "product", "versions",
+        "published_date"}]. 'name' is as in match_inventory(); 'since' (ISO date) keeps newer ones only.
+        \"\"\"
+        vendor, product = _inventory_key(name)
+        clauses, params = ["product = ?"], [product]
+        if vendor:
+            clauses.append("vendor = ?")
+            params.append(vendor)
+        if since:
+            clauses.append("published_date >= ?")
+            params.append(since)
+        rows = self.conn.execute(
+            f"SELECT cve_id, source, vendor, product, versions, published_date FROM product_cves "
+            f"WHERE {' AND '.join(clauses)} ORDER BY published_date DESC, cve_id LIMIT ?", params + [limit],
+        ).fetchall()
+        return [{"cve_id": row[0], "source": row[1], "vendor": row[2], "product": row[3],
+                 "versions": row[4].split(",") if row[4] else [], "published_date": row[5]} for row in rows]
+
+    def match_inventory(self, entries, since=None, limit=100):
+        \"\"\"
+        Matches an asset inventory against the product index with one index probe per entry.
+        Entries are CPE 2.3 names, "vendor:product" pairs or product names (any vendor, MSRC-style
+        qualifiers such as "Version 22H2" or "for x64-based Systems" ignored). Returns
+        {entry: cves_for_product(entry)} for the entries that matched.
+        \"\"\"
+        matches = {}
+        for entry in dict.fromkeys(entry.strip() for entry in entries if entry.strip()):
+            cves = self.cves_for_product(entry, since=since, limit=limit)
+            if cves:
+                matches[entry] = cves
+        return matches
+
+    def query(self, endpoint, page=1, size=20, q=None):
+        \"\"\"
+        Answers a dashboard list request (e.g. "/nvd", page, size, q) with a PaginatedResponse-shaped
+        dict: {"items", "currentPage", "totalPages", "totalItems"}. 'q' is a full-text search; on the
+        endpoints listed newest first it counts and pages through at most STORE_SEARCH_MAX_RESULTS matches.
+        \"\"\"
+        table, where, order = STORE_ENDPOINTS[endpoint]
+        page = max(1, int(page))
+        size = max(1, min(int(size), STORE_MAX_PAGE_SIZE))
+        match = _fts_match(q) if q else ""
+        if match and table in STORE_DATE_ROWID_TABLES:
+            return self._search_newest(table, where, match, page, size)
+        clauses, params = [], []
+        if where:
+            clauses.append(f"{where[0]} = ?")
+            params.append(where[1])
+        if match:
+            clauses.append(f"rowid IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)")
+            params.append(match)
+        where_sql = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        if match and not where:
+            # Counting straight off the full-text index avoids materializing the matching rowids
+            total = self.conn.execute(f"SELECT COUNT(*) FROM {table}_fts WHERE {table}_fts MATCH ?", [match]).fetchone()[0]
+        else:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM {table}{where_sql}", params).fetchone()[0]
+        # Page over the (covering) index first and only then fetch the records, so deep pages stay cheap
+        rows = self.conn.execute(
+            f"SELECT record FROM {table} WHERE rowid IN "
+            f"(SELECT rowid FROM {table}{where_sql} ORDER BY {order} LIMIT ? OFFSET ?) ORDER BY {order}",
+            params + [size, (page - 1) * size],
+        ).fetchall()
+        return {
+            "items": [json.loads(row[0]) for row in rows],
+            "currentPage": page,
+            "totalPages": (total + size - 1) // size,
+            "totalItems": total,
+        }
+
+    def _search_newest(self, table, where, match, page, size):
+        # Matches come off the full-text index newest first (see STORE_DATE_ROWID_TABLES), so neither
+        # the count nor a page has to collect and sort every match
+        join = f" JOIN {table} t ON t.rowid = f.rowid AND t.{where[0]} = ?" if where else ""
+        matches = f"SELECT f.rowid FROM {table}_fts f{join} WHERE f.{table}_fts MATCH ?"
+        params = ([where[1]] if where else []) + [match]
+        total = self.conn.execute(f"SELECT COUNT(*) FROM ({matches} LIMIT ?)",
+                                  params + [STORE_SEARCH_MAX_RESULTS]).fetchone()[0]
+        offset = (page - 1) * size
+        rows = self.conn.execute(
+            f"SELECT record FROM {table} WHERE rowid IN ({matches} ORDER BY f.rowid DESC LIMIT ? OFFSET ?) ORDER BY rowid DESC",
+            params + [max(0, min(size, STORE_SEARCH_MAX_RESULTS - offset)), offset],
+        ).fetchall()
+        return {
+            "items": [json.loads(row[0]) for row in rows],
+            "currentPage": page,
+            "totalPages": (total + size - 1) // size,
+            "totalItems": total,
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+def update_store(store_path, output_dir, today, started):
+    \"\"\"Loads every snapshot (and NVD backfill) written by this run (see _is_fresh) into the IntelStore at store_path.\"\"\"
+    store = IntelStore(store_path)
+    try:
+        for source in SOURCE_STORE_TABLES:
+            snapshot_path = source_output_path(output_dir, source, today)
+            if _is_fresh(snapshot_path, started):
+                store.load_jsonl(source, snapshot_path)
+        backfill_path = source_output_path(output_dir, "nvd", today, "backfill")
+        if _is_fresh(backfill_path, started):
+            store.load_jsonl("nvd", backfill_path)
+    finally:
+        store.close()
+
+
+def write_inventory_matches(store_path, inventory_path, output_dir, today, since=None):
+    \"\"\"
+    Matches the products listed in inventory_path (one per line, '#' comments allowed) against the
+    store's product index and writes inventory_matches_YYYYMMDD.json: {product: [CVE, ...]}.
+    \"\"\"
+    with open(inventory_path, encoding="utf-8") as f:
+        entries = [line.split("#", 1)[0] for line in f]
+    store = IntelStore(store_path)
+    try:
+        matches = store.match_inventory(entries, since=since)
+    finally:
+        store.close()
+    _write_atomic(os.path.join(output_dir, f"inventory_matches_{today}.json"), json.dumps(matches))
+    logger.info(f"{len(matches)} inventory products have CVEs published since {since or 'ever'}")
+    return matches
+
+
+CVE_ID_RE = re.compile(r"\\bCVE-\\d{4}-\\d{4,}\\b", re.IGNORECASE)
+
+# Weights of the per-CVE risk (0..1) used for exploit chains. A chain's risk_score is its riskiest
+# CVE's risk scaled onto the dashboard's bands (>=1 medium, >=2 high, >=3 critical), plus a capped
+# bonus for further hops and further exploited CVEs, so chain size alone cannot lift a chain a band.
+RISK_WEIGHTS = {"cvss": 0.5, "exploited": 0.3, "publicly_disclosed": 0.1, "cisa": 0.1}
+CHAIN_RISK_SCALE = 4.0
+CHAIN_HOP_BONUS = 0.1
+CHAIN_EXPLOITED_BONUS = 0.2 # per exploited CVE besides the first
+CHAIN_BONUS_MAX = 0.4
+MAX_EXPLOIT_CHAINS = 100
+MAX_CHAIN_CVES = 8 # keeps transitively linked clusters from collapsing into one giant chain
+
+
+def _cve_ids_in(*texts):
+    \"\"\"Distinct CVE IDs (upper-cased, in order of appearance) found in the given strings.\"\"\"
+    found = {}
+    for text in texts:
+        for match in CVE_ID_RE.findall(text or ""):
+            found.setdefault(match.upper(), None)
+    return list(found)
+
+
+def _iter_jsonl(path):
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as in_f:
+        for line in in_f:
+            yield json.loads(line)
+
+
+def build_cve_index(output_dir, today):
+    \"\"\"
+    Joins today's NVD, MSRC and CISA outputs on CVE ID. Returns (index, links): 'index' maps each
+    CVE ID to its mentions plus the merged CVSS / exploited / disclosed / CISA facts; 'links' is one
+    (cve_ids, label) pair per record that names several CVEs. Besides a record's own cve_id, IDs are
+    taken from NVD references and descriptions, MSRC descriptions and CISA titles, summaries and links.
+    \"\"\"
+    index = {}
+
+    def entry(cve_id):
+        if cve_id not in index:
+            index[cve_id] = {"cve_id": cve_id, "mentions": [], "cvss": None, "exploited": False,
+                             "publicly_disclosed": False, "cisa_mentions": 0}
+        return index[cve_id]
+
+    def mention(cve_id, record, ref, via):
+        entry(cve_id)["mentions"].append({"source": record.get("source"), "type": record.get("type"),
+                                          "ref": ref, "via": via})
+
+    def merge_cvss(cve_id, cvss):
+        score = (cvss or {}).get("baseScore")
+        if score is not None:
+            current = entry(cve_id)["cvss"]
+            entry(cve_id)["cvss"] = score if current is None else max(current, score)
+
+    links = []
+    for record in _iter_jsonl(source_output_path(output_dir, "nvd", today)):
+        own = record.get("cve_id")
+        if not own:
+            continue
+        mention(own, record, own, "record")
+        merge_cvss(own, record.get("cvss"))
+        related = [cve for cve in _cve_ids_in(record.get("description"), *record.get("references") or []) if cve != own]
+        for cve in related:
+            mention(cve, record, own, "references")
+        if related:
+            links.append(([own] + related, f"NVD {own} references"))
+
+    for record in _iter_jsonl(source_output_path(output_dir, "msrc", today)):
+        own = record.get("cve_id")
+        if not own:
+            continue
+        mention(own, record, record.get("msrc_url"), "record")
+        merge_cvss(own, record.get("cvss"))
+        if str(record.get("exploited_status", "")).startswith("Yes"):
+            entry(own)["exploited"] = True
+        if str(record.get("publicly_disclosed", "")).startswith("Yes"):
+            entry(own)["publicly_disclosed"] = True
+        related = [cve for cve in _cve_ids_in(record.get("description")) if cve != own]
+        for cve in related:
+            mention(cve, record, record.get("msrc_url"), "description")
+        if related:
+            links.append(([own] + related, f"MSRC {own}"))
+
+    for source in ("cisa_alerts", "cisa_activity"):
+        for record in _iter_jsonl(source_output_path(output_dir, source, today)):
+            cves = _cve_ids_in(record.get("title"), record.get("summary"), record.get("link"))
+            for cve in cves:
+                mention(cve, record, record.get("link"), "summary")
+                entry(cve)["cisa_mentions"] += 1
+            if len(cves) > 1:
+                links.append((cves, f"{record.get('type')} '{record.get('title', '')}'"))
+
+    for item in index.values():
+        item["risk"] = round(_cve_risk(item), 4)
+    return index, links
+
+
+def _cve_risk(item):
+    cvss = item["cvss"] or 0.0
+    return (RISK_WEIGHTS["cvss"] * min(cvss, 10.0) / 10.0
+            + RISK_WEIGHTS["exploited"] * item["exploited"]
+            + RISK_WEIGHTS["publicly_disclosed"] * item["publicly_disclosed"]
+            + RISK_WEIGHTS["cisa"] * min(item["cisa_mentions"], 2) / 2)
+
+
+def _chain_risk(members, depth):
+    exploited = sum(1 for m in members if m["exploited"])
+    bonus = CHAIN_HOP_BONUS * (depth - 1) + CHAIN_EXPLOITED_BONUS * max(exploited - 1, 0)
+    return CHAIN_RISK_SCALE * max(m["risk"] for m in members) + min(bonus, CHAIN_BONUS_MAX)
+
+
+def build_exploit_chains(index, links, max_chains=MAX_EXPLOIT_CHAINS):
+    \"\"\"
+    Materializes ExploitChain records (cve_ids, risk_score, depth, summary) from the correlation.
+    CVEs named together by any record are linked; each connected group becomes a chain, listed
+    breadth-first from its riskiest CVE (at most MAX_CHAIN_CVES; the rest can seed their own chains),
+    with depth = number of hops + 1 from there. Lone CVEs are kept only when known to be exploited.
+    Returns the riskiest max_chains chains first.
+    \"\"\"
+    adjacency = {cve: set() for cve in index}
+    labels = {}
+    for cves, label in links:
+        for cve in cves:
+            adjacency[cve].update(c for c in cves if c != cve)
+            labels.setdefault(cve, []).append(label)
+
+    chains = []
+    seen = set()
+    for start in sorted(index, key=lambda cve: (-index[cve]["risk"], cve)):
+        if start in seen:
+            continue
+        order, level = [start], {start: 0}
+        for cve in order: # breadth-first; 'order' grows while iterating
+            for neighbour in sorted(adjacency[cve], key=lambda c: (-index[c]["risk"], c)):
+                if len(order) >= MAX_CHAIN_CVES:
+                    break
+                if neighbour not in level and neighbour not in seen:
+                    level[neighbour] = level[cve] + 1
+                    order.append(neighbour)
+        seen.update(order)
+        if len(order) == 1 and not index[start]["exploited"]:
+            continue
+
+        members = [index[cve] for cve in order]
+        scores = [m["cvss"] for m in members if m["cvss"] is not None]
+        parts = [f"{len(order)} linked CVE(s)" if len(order) > 1 else "Single CVE"]
+        if scores:
+            parts.append(f"max CVSS {max(scores)}")
+        exploited = [m["cve_id"] for m in members if m["exploited"]]
+        if exploited:
+            parts.append(f"exploited: {', '.join(exploited)}")
+        disclosed = [m["cve_id"] for m in members if m["publicly_disclosed"]]
+        if disclosed:
+            parts.append(f"publicly disclosed: {', '.join(disclosed)}")
+        via = list(dict.fromkeys(label for cve in order for label in labels.get(cve, [])))
+        if via:
+            parts.append("via " + "; ".join(via[:3]) + (f" (+{len(via) - 3} more)" if len(via) > 3 else ""))
+        depth = max(level.values()) + 1
+        chains.append({
+            "cve_ids": order,
+            "risk_score": round(_chain_risk(members, depth), 2),
+            "depth": depth,
+            "summary": "; ".join(parts) + ".",
+        })
+
+    chains.sort(key=lambda chain: -chain["risk_score"])
+    return chains[:max_chains]
+
+
+def correlate(output_dir, today, max_chains=MAX_EXPLOIT_CHAINS):
+    \"\"\"
+    Correlation stage: writes cve_index_YYYYMMDD.json (CVE ID -> mentions and merged risk facts)
+    and chains_YYYYMMDD.json (the day's ExploitChain list), so /chains/today is a file lookup.
+    \"\"\"
+    index, links = build_cve_index(output_dir, today)
+    chains = build_exploit_chains(index, links, max_chains=max_chains)
+    for name, payload in ((f"cve_index_{today}.json", index), (f"chains_{today}.json", chains)):
+        path = os.path.join(output_dir, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out_f:
+            json.dump(payload, out_f)
+        os.replace(tmp_path, path)
+    logger.info(f"Correlated {len(index)} CVEs into {len(chains)} exploit chains for {today}")
+    return chains
+
+
+# Alert linking (--link_alerts): ranks ATT&CK techniques and CVEs by text similarity to each CISA item.
+# Documents are indexed once as sparse term-frequency postings in a SQLite index that persists across
+# runs and only re-indexes records whose text changed; alerts are scored with BM25 (TF-IDF with length
+# normalization) by accumulating over the postings of their terms, never pairwise.
+LINK_TOP_K = 5
+LINK_MAX_QUERY_TERMS = 32 # an alert's rarest terms carry the signal; this bounds the postings read
+LINK_MAX_DF_RATIO = 0.5 # terms in more than half of a corpus are treated as stop words
+LINK_MIN_MATCHED_TERMS = 2
+LINK_BM25_K1 = 1.2
+LINK_BM25_B = 0.75
+_LINK_TOKEN_RE = re.compile(r"[a-z][a-z0-9]+(?:-[a-z0-9]+)*")
+_LINK_TAG_RE = re.compile(r"<[^>]+>")
+_LINK_STOP_WORDS = frozenset(
+    "about after also allow allows an and any are as at be been being by can could does for from has have "
+    "how into is it its may more most not of on or other such than that the their them these they this "
+    "those through to used uses using via was were when where which while who will with within would".split()
+)
+
+
+def _link_terms(*texts):
+    \"\"\"Term counts of the given texts: lower-cased words minus stop words and HTML, with plural 's' dropped.\"\"\"
+    terms = {}
+    for text in texts:
+        for token in _LINK_TOKEN_RE.findall(_LINK_TAG_RE.sub(" ", text or "").lower()):
+            if token in _LINK_STOP_WORDS:
+                continue
+            if len(token) > 4 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+                token = token[:-1]
+            terms[token] = terms.get(token, 0) + 1
+    return terms
+
+
+class AlertLinkIndex:
+    \"\"\"
+    Persistent inverted index of the documents alerts are linked to, one corpus per 'kind'
+    ("technique", "cve"). Holds per-document lengths and text hashes, per-term document frequencies
+    and (term, document, tf) postings, so corpus statistics stay exact as documents are added or replaced.
+    \"\"\"
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS docs (kind TEXT NOT NULL, doc_id TEXT NOT NULL, label TEXT, "
+                              "length INTEGER NOT NULL, text_hash TEXT NOT NULL, PRIMARY KEY (kind, doc_id)) WITHOUT ROWID")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS terms (kind TEXT NOT NULL, term TEXT NOT NULL, df INTEGER NOT NULL, "
+                              "PRIMARY KEY (kind, term)) WITHOUT ROWID")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS postings (kind TEXT NOT NULL, term TEXT NOT NULL, doc_id TEXT NOT NULL, "
+                              "tf INTEGER NOT NULL, length INTEGER NOT NULL, PRIMARY KEY (kind, term, doc_id)) WITHOUT ROWID")
+            # Replacing a document deletes its postings; CVE texts change from day to day
+            self.conn.execute("CREATE INDEX IF NOT EXISTS postings_doc ON postings (kind, doc_id)")
+
+    def add_documents(self, kind, documents):
+        \"\"\"
+        Indexes (doc_id, label, text) documents of 'kind'. Unchanged documents are skipped; changed
+        ones replace their previous postings. Returns the number of documents (re)indexed.
+        \"\"\"
+        known = dict(self.conn.execute("SELECT doc_id, text_hash FROM docs WHERE kind = ?", (kind,)))
+        df_changes = {}
+        indexed = 0
+        with self.conn:
+            for doc_id, label, text in documents:
+                text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+                previous = known.get(doc_id)
+                if previous == text_hash:
+                    continue
+                if previous is not None:
+                    for term in self._remove(kind, doc_id):
+                        df_changes[term] = df_changes.get(term, 0) - 1
+                known[doc_id] = text_hash
+                terms = _link_terms(text)
+                length = sum(terms.values())
+                self.conn.execute("INSERT INTO docs VALUES (?, ?, ?, ?, ?)", (kind, doc_id, label, length, text_hash))
+                self.conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?, ?)",
+                                      [(kind, term, doc_id, tf, length) for term, tf in terms.items()])
+                for term in terms:
+                    df_changes[term] = df_changes.get(term, 0) + 1
+                indexed += 1
+            # Document frequencies are applied once per batch rather than once per posting
+            self.conn.executemany("INSERT INTO terms VALUES (?, ?, ?) ON CONFLICT (kind, term) DO UPDATE SET df = df + excluded.df",
+                                  [(kind, term, change) for term, change in df_changes.items() if change])
+        return indexed
+
+    def _remove(self, kind, doc_id):
+        terms = [row[0] for row in self.conn.execute(
+            "SELECT term FROM postings WHERE kind = ? AND doc_id = ?", (kind, doc_id))]
+        self.conn.execute("DELETE FROM postings WHERE kind = ? AND doc_id = ?", (kind, doc_id))
+        self.conn.execute("DELETE FROM docs WHERE kind = ? AND doc_id = ?", (kind, doc_id))
+        return terms
+
+    def rank(self, kind, queries, top_k=LINK_TOP_K, exclude=None, group=None):
+        \"\"\"
+        Scores every query (a term-count dict) against the 'kind' corpus in one batch: the postings of
+        all distinct query terms are read once, then each query accumulates BM25 over its own terms.
+        Returns one list per query of {"id", "label", "score", "terms"}, best first; 'exclude' is an
+        optional per-query set of ids to leave out. 'group' optionally maps a doc id to the id it is
+        reported under; each group then keeps its best-scoring document.
+        \"\"\"
+        count, avg_length = self.conn.execute("SELECT COUNT(*), AVG(length) FROM docs WHERE kind = ?", (kind,)).fetchone()
+        if not count:
+            return [[] for _ in queries]
+        wanted = sorted({term for query in queries for term in query})
+        idf = {}
+        for start in range(0, len(wanted), 500):
+            chunk = wanted[start:start + 500]
+            for term, df in self.conn.execute(
+                    f"SELECT term, df FROM terms WHERE kind = ? AND df > 0 AND term IN ({', '.join('?' * len(chunk))})",
+                    [kind] + chunk):
+                if df <= count * LINK_MAX_DF_RATIO:
+                    idf[term] = math.log(1 + (count - df + 0.5) / (df + 0.5))
+        selected = [sorted((term for term in query if term in idf), key=lambda term: -idf[term])[:LINK_MAX_QUERY_TERMS]
+                    for query in queries]
+        postings = {term: [] for term in {term for terms in selected for term in terms}}
+        terms_list = sorted(postings)
+        for start in range(0, len(terms_list), 500):
+            chunk = terms_list[start:start + 500]
+            for term, doc_id, tf, length in self.conn.execute(
+                    f"SELECT term, doc_id, tf, length FROM postings WHERE kind = ? AND term IN ({', '.join('?' * len(chunk))})",
+                    [kind] + chunk):
+                norm = tf * (LINK_BM25_K1 + 1) / (tf + LINK_BM25_K1 * (1 - LINK_BM25_B + LINK_BM25_B * length / avg_length))
+                postings[term].append((doc_id, idf[term] * norm))
+
+        results = []
+        for position, terms in enumerate(selected):
+            scores, matched = {}, {}
+            for term in terms:
+                for doc_id, weight in postings[term]:
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight
+                    matched.setdefault(doc_id, []).append(term)
+            skip = exclude[position] if exclude else ()
+            candidates = {}
+            for doc_id, score in scores.items():
+                if len(matched[doc_id]) < LINK_MIN_MATCHED_TERMS:
+                    continue
+                result_id = group(doc_id) if group else doc_id
+                if result_id not in skip and (result_id not in candidates or score > candidates[result_id][1]):
+                    candidates[result_id] = (doc_id, score)
+            best = heapq.nlargest(top_k, candidates.items(), key=lambda item: item[1][1])
+            labels = dict(self.conn.execute(
+                f"SELECT doc_id, label FROM docs WHERE kind = ? AND doc_id IN ({', '.join('?' * len(best))})",
+                [kind] + [doc_id for _, (doc_id, _) in best])) if best else {}
+            results.append([{"id": result_id, "label": labels.get(doc_id), "score": round(score, 3), "terms": matched[doc_id]}
+                            for result_id, (doc_id, score) in best])
+        return results
+
+    def close(self):
+        self.conn.close()
+
+
+def _link_cve_id(doc_id):
+    \"\"\"CVE ID of a per-source "cve" document id ("nvd:CVE-...").\"\"\"
+    return doc_id.partition(":")[2]
+
+
+def link_alerts(index_path, output_dir, today, top_k=LINK_TOP_K):
+    \"\"\"
+    Similarity stage: adds today's ATT&CK techniques and NVD/MSRC CVEs to the AlertLinkIndex at
+    index_path, then ranks candidate techniques and CVEs for every CISA item of the day and writes
+    alert_links_YYYYMMDD.jsonl: { "type", "title", "link", "techniques": [...], "cves": [...] }.
+    CVEs an alert already names are left out; the correlation stage links those.
+    \"\"\"
+    index = AlertLinkIndex(index_path)
+    try:
+        techniques = []
+        for source in ("mitre_enterprise", "mitre_ics"):
+            for record in _iter_jsonl(source_output_path(output_dir, source, today)):
+                if record.get("technique_id"):
+                    label = f"{record.get('name', '')} ({record.get('framework')})"
+                    techniques.append((record["technique_id"], label, f"{record.get('name', '')} {record.get('description', '')}"))
+        # NVD and MSRC describe the same CVE; each source's text is its own document ("nvd:CVE-..."),
+        # so a day missing one source neither drops nor re-indexes the other's text
+        cves = []
+        for source in ("nvd", "msrc"):
+            for record in _iter_jsonl(source_output_path(output_dir, source, today)):
+                if record.get("cve_id"):
+                    label = record.get("title") or (record.get("description") or "")[:120]
+                    text = " ".join(filter(None, [record.get("title"), record.get("description")]))
+                    cves.append((f"{source}:{record['cve_id']}", label, text))
+        added = index.add_documents("technique", techniques) + index.add_documents("cve", cves)
+
+        alerts = [record for source in ("cisa_alerts", "cisa_activity")
+                  for record in _iter_jsonl(source_output_path(output_dir, source, today))]
+        queries = [_link_terms(alert.get("title"), alert.get("summary")) for alert in alerts]
+        named = [set(_cve_ids_in(alert.get("title"), alert.get("summary"), alert.get("link"))) for alert in alerts]
+        technique_links = index.rank("technique", queries, top_k=top_k)
+        cve_links = index.rank("cve", queries, top_k=top_k, exclude=named, group=_link_cve_id)
+    finally:
+        index.close()
+
+    path = os.path.join(output_dir, f"alert_links_{today}.jsonl")
+    with _open_atomic(path) as out_f:
+        for alert, technique_candidates, cve_candidates in zip(alerts, technique_links, cve_links):
+            out_f.write(json.dumps({
+                "type": alert.get("type"),
+                "title": alert.get("title"),
+                "link": alert.get("link"),
+                "techniques": [{"technique_id": c["id"], "name": c["label"], "score": c["score"], "terms": c["terms"]}
+                               for c in technique_candidates],
+                "cves": [{"cve_id": c["id"], "title": c["label"], "score": c["score"], "terms": c["terms"]}
+                         for c in cve_candidates],
+            }) + "\\n")
+    logger.info(f"Linked {len(alerts)} CISA items to techniques and CVEs ({added} documents (re)indexed) -> {path}")
+    return path
+
+
+# Daily rollup (--rollup): facet counts and top-N lists kept by a sink on every source output as its
+# records are written, saved as rollup_YYYYMMDD.json so the brief and the charts need no rescan.
+ROLLUP_TOP_N = 10
+
+# Set per run by run_ingest() when --rollup is given
+ROLLUP = None
+
+
+def _severity(cvss):
+    \"\"\"A record's CVSS severity label, upper-cased; derived from the base score when the feed gave none.\"\"\"
+    cvss = cvss or {}
+    if cvss.get("severity"):
+        return str(cvss["severity"]).upper()
+    score = cvss.get("baseScore")
+    if score is None:
+        return "UNKNOWN"
+    if cvss.get("version") == "2.0":
+        return "HIGH" if score >= 7 else "MEDIUM" if score >= 4 else "LOW"
+    return "CRITICAL" if score >= 9 else "HIGH" if score >= 7 else "MEDIUM" if score >= 4 else "LOW" if score > 0 else "NONE"
+
+
+class _RollupSink:
+    \"\"\"Accumulates the facets of one source output; handed to the DailyRollup only once the output is committed.\"\"\"
+
+    def __init__(self, rollup, source):
+        self.rollup = rollup
+        self.source = source
+        self.total = 0
+        self.facets = {}
+        self.top = [] # min-heap of (rank, sequence, entry), at most ROLLUP_TOP_N long
+        self._sequence = 0
+
+    def _count(self, facet, value):
+        counts = self.facets.setdefault(facet, {})
+        counts[value] = counts.get(value, 0) + 1
+
+    def _offer(self, rank, entry):
+        if rank is None:
+            return
+        self._sequence += 1
+        if len(self.top) < ROLLUP_TOP_N:
+            heapq.heappush(self.top, (rank, self._sequence, entry))
+        elif rank > self.top[0][0]:
+            heapq.heapreplace(self.top, (rank, self._sequence, entry))
+
+    def write(self, record, line):
+        self.total += 1
+        if self.source in ("nvd", "msrc"):
+            cvss = record.get("cvss") or {}
+            severity = _severity(cvss)
+            self._count("by_severity", severity)
+            entry = {"cve_id": record.get("cve_id"), "score": cvss.get("baseScore"), "severity": severity}
+            if self.source == "nvd":
+                self._count("by_cvss_version", cvss.get("version") or "none")
+                entry.update(source="NVD", title=(record.get("description") or "")[:160])
+            else:
+                exploited = str(record.get("exploited_status") or "").lower().startswith("yes")
+                disclosed = str(record.get("publicly_disclosed") or "").lower().startswith("yes")
+                if exploited:
+                    self._count("flags", "exploited")
+                if disclosed:
+                    self._count("flags", "publicly_disclosed")
+                entry.update(source="MSRC", title=record.get("title") or "", exploited=exploited)
+            self._offer(cvss.get("baseScore"), entry)
+        elif self.source.startswith("mitre_"):
+            for tactic in record.get("tactics") or []:
+                self._count("by_tactic", tactic)
+            for platform in record.get("platforms") or []:
+                self._count("by_platform", platform)
+        else: # CISA feeds: keep the most recent items
+            self._offer(record.get("published_date") or None, {"title": record.get("title"), "link": record.get("link"),
+                                                               "published_date": record.get("published_date")})
 
-def fetch_url(url, headers=None, decompress_gzip=False, timeout=60, is_json=True):
+    def commit(self):
+        top = [entry for _, _, entry in sorted(self.top, reverse=True)]
+        self.rollup.update(self.source, {"total": self.total, "facets": self.facets, "top": top})
+
+    def discard(self):
+        pass
+
+
+class DailyRollup:
     \"\"\"
-    Fetches content from a URL. If decompress_gzip is True, decompresses gzip.
-    Returns raw bytes (decompressed if needed) or parsed JSON if is_json is True.
+    The rollup document of one day, built from one partial (total, facets, top entries) per source.
+    Partials of sources not run this time are loaded from the day's existing document, so runs over
+    a subset of the sources (e.g. --daemon polls) update it in place.
     \"\"\"
-    effective_headers = {"User-Agent": DEFAULT_USER_AGENT}
-    if headers:
-        effective_headers.update(headers)
-    
-    try:
-        logger.info(f"Fetching: {url}")
-        resp = requests.get(url, headers=effective_headers, timeout=timeout, stream=True)
-        resp.raise_for_status()
-        
-        if decompress_gzip:
-            content_bytes = gzip.decompress(resp.raw.read())
-        else:
-            content_bytes = resp.raw.read()
 
-        if is_json:
-            return json.loads(content_bytes.decode('utf-8'))
-        return content_bytes
-    except requests.RequestException as e:
-        logger.error(f"Error fetching {url}: {e}")
-        return None
-    except json.JSONDecodeError as e:
-        logger.error(f"Error decoding JSON from {url}: {e}")
-        return None
-    except gzip.BadGzipFile as e:
-        logger.error(f"Error decompressing Gzip from {url}: {e}")
-        return None
+    def __init__(self, output_dir, day):
+        self.day = day
+        self.path = os.path.join(output_dir, f"rollup_{day}.json")
+        self.partials = {}
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.partials = json.load(f).get("sources", {})
+        except (OSError, ValueError):
+            pass
 
-def parse_nvd_json(nvd_data, output_path):
+    def sink(self, source):
+        return _RollupSink(self, source)
+
+    def update(self, source, partial):
+        with self._lock:
+            self.partials[source] = partial
+
+    def document(self):
+        with self._lock:
+            partials = dict(self.partials)
+        empty = {"total": 0, "facets": {}, "top": []}
+
+        def facet(sources, name):
+            counts = {}
+            for source in sources:
+                for value, count in partials.get(source, empty)["facets"].get(name, {}).items():
+                    counts[value] = counts.get(value, 0) + count
+            return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+        top_cves, seen = [], set()
+        candidates = partials.get("nvd", empty)["top"] + partials.get("msrc", empty)["top"]
+        for entry in sorted(candidates, key=lambda entry: -entry["score"]):
+            if entry["cve_id"] not in seen and len(top_cves) < ROLLUP_TOP_N:
+                seen.add(entry["cve_id"])
+                top_cves.append(entry)
+        cisa_latest = sorted(partials.get("cisa_alerts", empty)["top"] + partials.get("cisa_activity", empty)["top"],
+                             key=lambda entry: entry["published_date"], reverse=True)[:ROLLUP_TOP_N]
+        msrc_flags = facet(["msrc"], "flags")
+        return {
+            "date": f"{self.day[:4]}-{self.day[4:6]}-{self.day[6:]}",
+            "generated": datetime.now(timezone.utc).isoformat(),
+            "cves": {
+                "total": partials.get("nvd", empty)["total"],
+                "by_severity": facet(["nvd"], "by_severity"),
+                "by_cvss_version": facet(["nvd"], "by_cvss_version"),
+            },
+            "msrc": {
+                "total": partials.get("msrc", empty)["total"],
+                "by_severity": facet(["msrc"], "by_severity"),
+                "exploited": msrc_flags.get("exploited", 0),
+                "publicly_disclosed": msrc_flags.get("publicly_disclosed", 0),
+            },
+            "top_cves": top_cves,
+            "attack": {
+                framework: {
+                    "techniques": partials.get(f"mitre_{framework}", empty)["total"],
+                    "by_tactic": facet([f"mitre_{framework}"], "by_tactic"),
+                    "by_platform": facet([f"mitre_{framework}"], "by_platform"),
+                }
+                for framework in ("enterprise", "ics")
+            },
+            "cisa": {
+                "alerts": partials.get("cisa_alerts", empty)["total"],
+                "activity": partials.get("cisa_activity", empty)["total"],
+                "latest": cisa_latest,
+            },
+            "sources": partials,
+        }
+
+    def write(self):
+        _write_atomic(self.path, json.dumps(self.document()))
+        logger.info(f"Wrote daily rollup to {self.path}")
+
+
+def ingest_nvd(output_dir, today, timeout=60, url=None):
     \"\"\"
-    Parses NVD JSON data and writes a normalized JSONL file.
-    Each line: { "type": "CVE", "cve_id": ..., "cvss_v3": ..., "published_date": ..., "description": ... }
+    Fetch & parse an NVD 1.1 feed (the "recent" feed by default).
+    CVE_Items are gunzipped and decoded as they arrive and written one at a time, so memory stays
+    flat even for yearly or complete dumps.
     \"\"\"
+    url = url or NVD_RECENT_URL
+    output_path = source_output_path(output_dir, "nvd", today)
+    nvd_items = fetch_json_items(url, "CVE_Items", decompress_gzip=True, timeout=timeout, reuse_output=output_path)
+    if nvd_items is NOT_MODIFIED:
+        return
+    if nvd_items is not None:
+        _record_cached_output(url, output_path, parse_nvd_json(nvd_items, output_path))
+    else:
+        logger.warning("Skipping NVD parsing due to fetch error.")
+
+
+def _cve_sort_key(cve_id):
+    \"\"\"Numeric (year, sequence) order for CVE IDs; anything unparseable sorts first, by its text.\"\"\"
     try:
-        logger.info("Parsing NVD JSON feed")
-        if not nvd_data:
-            logger.warning("No NVD data received for parsing.")
-            return
+        _, year, number = cve_id.split("-")
+        return (int(year), int(number), "")
+    except (AttributeError, ValueError):
+        return (0, 0, cve_id or "")
 
-        entries = nvd_data.get("CVE_Items", [])
-        with open(output_path, "w", encoding="utf-8") as out_f:
-            for item in tqdm(entries, desc="NVD → JSONL"):
-                cve_meta = item.get("cve", {}).get("CVE_data_meta", {})
-                cve_id = cve_meta.get("ID")
-                desc_data = item.get("cve", {}).get("description", {}).get("description_data", [])
-                description = ""
-                for d in desc_data:
-                    if d.get("lang") == "en":
-                        description = d.get("value", "")
-                        break
-                
-                cvss_v3_data = item.get("impact", {}).get("baseMetricV3", {}).get("cvssV3", {})
-                cvss_v2_data = item.get("impact", {}).get("baseMetricV2", {}).get("cvssV2", {})
-                
-                cvss_info = {}
-                if cvss_v3_data and cvss_v3_data.get("baseScore") is not None:
-                    cvss_info = {
-                        "version": "3.x",
-                        "baseScore": cvss_v3_data.get("baseScore"),
-                        "severity": cvss_v3_data.get("baseSeverity"),
-                        "vectorString": cvss_v3_data.get("vectorString"),
-                    }
-                elif cvss_v2_data and cvss_v2_data.get("baseScore") is not None: # Fallback to CVSSv2
-                     cvss_info = {
-                        "version": "2.0",
-                        "baseScore": cvss_v2_data.get("baseScore"),
-                        "severity": cvss_v2_data.get("severity"),
-                        "vectorString": cvss_v2_data.get("vectorString"),
-                    }
-
-                published_date = item.get("publishedDate")
-                last_modified_date = item.get("lastModifiedDate")
-
-                norm_record = {
-                    "type": "CVE",
-                    "source": "NVD",
-                    "cve_id": cve_id,
-                    "cvss": cvss_info, # Combined CVSS info
-                    "published_date": published_date,
-                    "last_modified_date": last_modified_date,
-                    "description": description,
-                    "references": [ref.get("url") for ref in item.get("cve", {}).get("references", {}).get("reference_data", [])]
-                }
-                out_f.write(json.dumps(norm_record) + "\\n")
-        logger.info(f"Wrote parsed CVEs to {output_path}")
-    except Exception as e:
-        logger.error(f"Failed parsing NVD JSON: {e}", exc_info=True)
 
-def parse_mitre_stix(stix_data, output_path, framework_name):
+def _normalize_nvd_shard(feed_path, shard_path, serialize_record=_json_line):
     \"\"\"
-    Parses MITRE ATT&CK STIX objects and writes a JSONL file containing techniques.
-    { "type": "ATT&CK", "framework": "enterprise/ics", "technique_id": ..., "name": ..., "description": ..., "tactics": [...] }
+    Process-pool worker for backfill_nvd: normalizes one downloaded yearly feed into shard_path,
+    sorted by CVE ID so the shards can be merged in one streaming pass. Records are written in feed
+    order and then reordered on disk (_sort_shard), so only their sort keys are held in memory.
+    Returns (records written, this process's stage metrics) for the parent to fold into its own METRICS.
     \"\"\"
+    global METRICS, SERIALIZE_RECORD
+    METRICS = RunMetrics()
+    SERIALIZE_RECORD = serialize_record
+    unsorted_path = f"{shard_path}.unsorted"
+    keys = []
     try:
-        from io import BytesIO
-        import zipfile
-        
-        logger.info(f"Parsing MITRE STIX feed for {framework_name}")
-        if not stix_data:
-             logger.warning(f"No MITRE STIX data received for {framework_name}.")
-             return
+        with open(feed_path, "rb") as raw, _MeteredReader(gzip.GzipFile(fileobj=raw), "decompress") as metered:
+            items = stream_json_array(io.TextIOWrapper(io.BufferedReader(metered), encoding="utf-8"), "CVE_Items")
+            with open_output(unsorted_path) as out_f:
+                for item in _metered_items(items):
+                    record = normalize_nvd_item(item)
+                    keys.append(_cve_sort_key(record["cve_id"]))
+                    out_f.write_record(record)
+        with METRICS.timer("sort"):
+            _sort_shard(unsorted_path, shard_path, keys)
+    finally:
+        try:
+            os.remove(unsorted_path)
+        except FileNotFoundError:
+            pass
+    return len(keys), {stage: stats for (_, stage), stats in METRICS.stages.items()}
 
-        # If stix_data is bytes and starts with PK (zip signature), decompress. Otherwise assume parsed JSON.
-        # The fetch_url now handles JSON parsing, so stix_data should be a dict.
-        # The example URL for MITRE includes .zip, so fetch_url needs to handle raw bytes for zip.
-        # Let's assume fetch_url(..., is_json=False) was used for zip files.
-        
-        parsed_stix_data = None
-        if isinstance(stix_data, bytes): # If raw bytes from a ZIP file
-            if stix_data[:2] == b"PK":
-                logger.info(f"Detected ZIP format for MITRE STIX ({framework_name}); decompressing")
-                with zipfile.ZipFile(BytesIO(stix_data)) as z:
-                    json_fnames = [f for f in z.namelist() if f.endswith(".json")]
-                    if not json_fnames:
-                        raise ValueError("No JSON file found inside STIX ZIP")
-                    with z.open(json_fnames[0]) as json_file:
-                        parsed_stix_data = json.load(json_file)
-            else: # Not a zip, try to decode as JSON directly if it's bytes
+
+def _sort_shard(unsorted_path, shard_path, keys):
+    \"\"\"
+    Writes the lines of unsorted_path to shard_path in (stable) order of keys, keys[i] being the sort
+    key of line i. Holds one byte offset per line and copies the lines one at a time by seeking.
+    \"\"\"
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    if all(i == n for n, i in enumerate(order)):
+        os.replace(unsorted_path, shard_path)
+        return
+    with open(unsorted_path, "rb") as in_f:
+        offsets = []
+        offset = 0
+        for line in in_f:
+            offsets.append(offset)
+            offset += len(line)
+        if len(offsets) != len(keys):
+            raise ValueError(f"{unsorted_path} has {len(offsets)} lines for {len(keys)} sort keys")
+        with open(shard_path, "wb") as out_f:
+            for i in order:
+                in_f.seek(offsets[i])
+                out_f.write(in_f.readline())
+
+
+def _merge_nvd_shards(shard_paths, output_path):
+    \"\"\"
+    k-way merges CVE-sorted shards into output_path, keeping one record per CVE ID: the one with the
+    latest last_modified_date (on a tie, the later shard). Returns (written, duplicates dropped).
+    \"\"\"
+    def read(path):
+        with open(path, encoding="utf-8") as in_f:
+            for line in in_f:
+                record = json.loads(line)
+                yield _cve_sort_key(record.get("cve_id")), record
+
+    written = duplicates = 0
+    with open_output(output_path) as out_f:
+        best_key = best = None
+        for key, record in heapq.merge(*(read(path) for path in shard_paths), key=lambda pair: pair[0]):
+            if best is not None and key == best_key:
+                duplicates += 1
+                if (record.get("last_modified_date") or "") >= (best.get("last_modified_date") or ""):
+                    best = record
+                continue
+            if best is not None:
+                out_f.write_record(best)
+                written += 1
+            best_key, best = key, record
+        if best is not None:
+            out_f.write_record(best)
+            written += 1
+    return written, duplicates
+
+
+def backfill_nvd(output_dir, today, first_year, last_year, workers=None, timeout=120):
+    \"\"\"
+    Rebuilds the NVD corpus from the yearly 1.1 feeds into cve_nvd_backfill_YYYYMMDD.jsonl.
+    Downloads run on MAX_REQUESTS_PER_HOST threads (the feeds share one host) and each finished
+    feed is handed straight to a process pool of 'workers' (default: one per core) that normalizes
+    it into a sorted per-year shard; the shards are then merged, deduplicated by CVE ID. Years that
+    fail are logged and left out. Returns the number of records written, or None.
+    \"\"\"
+    years = list(range(first_year, last_year + 1))
+    output_path = source_output_path(output_dir, "nvd", today, "backfill")
+    spool_dir = tempfile.mkdtemp(prefix=".nvd_backfill_", dir=output_dir)
+    logger.info(f"Backfilling NVD {first_year}-{last_year} ({len(years)} feeds, {workers or os.cpu_count()} workers)")
+    try:
+        shards = {}
+        # spawn rather than fork: the download threads may hold locks a forked child would inherit
+        with ThreadPoolExecutor(max_workers=MAX_REQUESTS_PER_HOST, thread_name_prefix="nvd-backfill") as fetchers, \\
+                ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as shard_pool:
+            downloads = {}
+            for year in years:
+                feed_path = os.path.join(spool_dir, f"nvdcve-1.1-{year}.json.gz")
+                future = fetchers.submit(contextvars.copy_context().run, fetch_to_file,
+                                         NVD_YEARLY_URL.format(year=year), feed_path, timeout=timeout)
+                downloads[future] = (year, feed_path)
+            normalizing = {}
+            for future in as_completed(downloads):
+                year, feed_path = downloads[future]
+                if not future.result():
+                    logger.error(f"NVD {year} feed could not be fetched; left out of the backfill.")
+                    METRICS.source_failed()
+                    continue
+                shard_path = os.path.join(spool_dir, f"nvd_{year}.jsonl")
+                normalizing[shard_pool.submit(_normalize_nvd_shard, feed_path, shard_path,
+                                              SERIALIZE_RECORD)] = (year, shard_path)
+            for future in as_completed(normalizing):
+                year, shard_path = normalizing[future]
                 try:
-                    parsed_stix_data = json.loads(stix_data.decode('utf-8'))
-                except Exception as e_decode:
-                    logger.error(f"STIX data for {framework_name} is bytes but not ZIP or valid JSON: {e_decode}")
-                    return
-        elif isinstance(stix_data, dict): # Already parsed JSON
-            parsed_stix_data = stix_data
-        else:
-            logger.error(f"Unexpected data type for MITRE STIX ({framework_name}): {type(stix_data)}")
-            return
+                    count, stages = future.result()
+                except Exception as e:
+                    logger.error(f"Failed normalizing NVD {year} feed: {e}; left out of the backfill.")
+                    METRICS.source_failed()
+                    continue
+                METRICS.merge(stages)
+                shards[year] = shard_path
+                logger.info(f"Normalized {count} CVEs from the NVD {year} feed")
+
+        if not shards:
+            logger.error("NVD backfill produced no shards; nothing written.")
+            METRICS.source_failed()
+            return None
+        written, duplicates = _merge_nvd_shards([shards[year] for year in sorted(shards)], output_path)
+        logger.info(f"Wrote {written} CVEs from {len(shards)} yearly feeds to {output_path} ({duplicates} duplicates dropped)")
+        return written
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
 
-        if not parsed_stix_data:
-            logger.error(f"Failed to obtain parsed JSON from STIX data for {framework_name}.")
+
+def ingest_mitre(output_dir, today, framework_name, url, timeout=60, relationships=False):
+    \"\"\"
+    Fetch & parse a MITRE ATT&CK STIX collection ('enterprise' or 'ics').
+    The zip is spooled to a temp file and the bundle streamed out of it, so peak memory is a small
+    fraction of the bundle. With 'relationships', attack_<framework>_relationships_YYYYMMDD.jsonl
+    is written from the same pass.
+    \"\"\"
+    source = f"mitre_{framework_name}"
+    output_path = source_output_path(output_dir, source, today)
+    relationships_path = source_output_path(output_dir, source, today, "relationships") if relationships else None
+    fd, spool_path = tempfile.mkstemp(prefix=f"attack_{framework_name}_", suffix=".stix")
+    os.close(fd)
+    try:
+        # Reusing the previous output on a 304 would leave the relationship index unwritten
+        stix_path = fetch_to_file(url, spool_path, timeout=timeout,
+                                  reuse_output=None if relationships else output_path)
+        if stix_path is NOT_MODIFIED:
             return
+        if stix_path and _payload_unchanged(output_path, _file_sha256(stix_path),
+                                            also=[relationships_path] if relationships_path else ()):
+            return
+        if stix_path:
+            _record_cached_output(url, output_path, parse_mitre_stix(stix_path, output_path, framework_name,
+                                                                     relationships_path=relationships_path))
+        else:
+            logger.warning(f"Skipping MITRE {framework_name} parsing due to fetch error.")
+    finally:
+        os.remove(spool_path)
 
-        objects = parsed_stix_data.get("objects", [])
-        with open(output_path, "w", encoding="utf-8") as out_f:
-            for obj in tqdm(objects, desc=f"ATT&CK {framework_name} → JSONL"):
-                if obj.get("type") == "attack-pattern": # Corrected hyphen
-                    tech_id = ""
-                    # Find external ID (Txxxx)
-                    for ref in obj.get("external_references", []):
-                        if ref.get("source_name") == "mitre-attack" or ref.get("source_name") == f"mitre-ics-attack":
-                            tech_id = ref.get("external_id", "")
-                            break
-                    
-                    name = obj.get("name", "")
-                    description = obj.get("description", "").strip()
-                    tactics = [phase.get("phase_name") for phase in obj.get("kill_chain_phases", []) if phase.get("kill_chain_name") in ["mitre-attack", "mitre-ics-attack"]]
-                    platforms = obj.get("x_mitre_platforms", [])
-                    data_sources = obj.get("x_mitre_data_sources", [])
-                    created = obj.get("created")
-                    modified = obj.get("modified")
-
-                    norm_record = {
-                        "type": "ATT&CK",
-                        "source": "MITRE",
-                        "framework": framework_name,
-                        "technique_id": tech_id,
-                        "name": name,
-                        "description": description,
-                        "tactics": tactics,
-                        "platforms": platforms,
-                        "data_sources": data_sources,
-                        "created_date": created,
-                        "modified_date": modified
-                    }
-                    out_f.write(json.dumps(norm_record) + "\\n")
-        logger.info(f"Wrote parsed ATT&CK {framework_name} techniques to {output_path}")
-    except Exception as e:
-        logger.error(f"Failed parsing MITRE STIX for {framework_name}: {e}", exc_info=True)
+
+def build_sources(output_dir, today, lookback_days, attack_relationships=False):
+    \"\"\"
+    Returns the ordered list of (source_name, callable) ingest jobs.
+    Each callable fetches, parses and writes one source and is independent of the others.
+    \"\"\"
+    return [
+        ("nvd", lambda: ingest_nvd(output_dir, today, timeout=SOURCE_TIMEOUTS["nvd"])),
+        ("mitre_enterprise", lambda: ingest_mitre(output_dir, today, "enterprise", MITRE_ENTERPRISE_URL,
+                                                  timeout=SOURCE_TIMEOUTS["mitre_enterprise"],
+                                                  relationships=attack_relationships)),
+        ("mitre_ics", lambda: ingest_mitre(output_dir, today, "ics", MITRE_ICS_URL,
+                                           timeout=SOURCE_TIMEOUTS["mitre_ics"],
+                                           relationships=attack_relationships)),
+        ("cisa_alerts", lambda: parse_cisa_rss(CISA_ALERTS_URL, source_output_path(output_dir, "cisa_alerts", today),
+                                               "CISA_ALERT", timeout=SOURCE_TIMEOUTS["cisa_alerts"])),
+        ("cisa_activity", lambda: parse_cisa_rss(CISA_ACTIVITY_URL, source_output_path(output_dir, "cisa_activity", today),
+                                                 "CISA_ACTIVITY", timeout=SOURCE_TIMEOUTS["cisa_activity"])),
+        ("msrc", lambda: parse_msrc_api(source_output_path(output_dir, "msrc", today),
+                                        lookback_days=lookback_days, timeout=SOURCE_TIMEOUTS["msrc"])),
+    ]
 
 
-def parse_cisa_rss(rss_url, output_path, alert_type_name):
+def _run_source(name, job, profile_dir=None):
     \"\"\"
-    Parses a CISA RSS feed and writes a normalized JSONL file.
-    Each line: { "type": alert_type_name, "title": ..., "link": ..., "published_date": ..., "summary": ... }
+    Runs one ingest job, timing it and containing any failure to that source. Its stage metrics
+    are attributed to 'name'; with 'profile_dir' the job runs under cProfile, saved as <name>.prof.
     \"\"\"
+    token = _current_source.set(name)
+    if CHECKPOINT is not None:
+        CHECKPOINT.start(name)
+    profiler = cProfile.Profile() if profile_dir else None
+    started = time.monotonic()
     try:
-        logger.info(f"Fetching and parsing CISA RSS feed: {rss_url} as {alert_type_name}")
-        # feedparser handles fetching internally
-        feed_data = feedparser.parse(rss_url) 
-        
-        if feed_data.bozo: # Check for errors during parsing
-            bozo_exception = feed_data.bozo_exception
-            logger.warning(f"Warning parsing RSS feed {rss_url} (might be malformed or fetch error): {bozo_exception}")
-            # Continue if entries exist, otherwise return
-            if not feed_data.entries:
-                 logger.error(f"No entries found and bozo flag set for {rss_url}. Skipping.")
-                 return
+        if profiler:
+            profiler.enable()
+        job()
+        ok = True
+    except Exception as e:
+        logger.error(f"Source {name} failed: {e}", exc_info=True)
+        ok = False
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
+        _current_source.reset(token)
+    elapsed = time.monotonic() - started
+    ok = METRICS.source_done(name, ok, elapsed)
+    logger.info(f"Source {name} finished in {elapsed:.1f}s ({'ok' if ok else 'failed'})")
+    return ok
 
-        with open(output_path, "w", encoding="utf-8") as out_f:
-            for entry in tqdm(feed_data.entries, desc=f"{alert_type_name} → JSONL"):
-                title = entry.get("title", "")
-                link = entry.get("link", "")
-                
-                published_date_parsed = entry.get("published_parsed")
-                published_date_iso = ""
-                if published_date_parsed:
-                    try:
-                        # Create datetime object, assume UTC if not specified by feedparser
-                        dt_obj = datetime(*published_date_parsed[:6])
-                        # If feedparser doesn't provide tzinfo, assume UTC for ISO formatting consistency
-                        if dt_obj.tzinfo is None:
-                            dt_obj = dt_obj.replace(tzinfo=timezone.utc)
-                        published_date_iso = dt_obj.isoformat()
-                    except Exception as e_date:
-                        logger.warning(f"Could not parse date for RSS entry '{title}': {e_date}. Using raw: {entry.get('published')}")
-                        published_date_iso = entry.get("published", "") # Fallback to raw string
-                else:
-                     published_date_iso = entry.get("published", "")
 
+def main(output_dir, lookback_days, concurrent=False, max_workers=6, max_per_host=2,
+         cache_dir=None, cache_max_mb=512, delta=False, state_dir=None, store_path=None,
+         correlate_cves=False, attack_relationships=False, metrics_json=None, prometheus_textfile=None,
+         profile_dir=None, trace_memory=False, progress=True, export_formats=None, export_dir=None,
+         backfill=None, backfill_workers=None, daemon=False, poll_intervals=None, rollup=False,
+         inventory_path=None, link=False, link_index=None, resume=False, use_orjson=False):
+    global MAX_REQUESTS_PER_HOST, HTTP_CACHE, SHOW_PROGRESS, EXPORTER, SERIALIZE_RECORD
+    MAX_REQUESTS_PER_HOST = max(1, max_per_host)
+    SHOW_PROGRESS = progress
+    SERIALIZE_RECORD = _json_line
+    if use_orjson:
+        if orjson is None:
+            logger.warning("--orjson needs the orjson package (pip install orjson); using the stdlib encoder.")
+        else:
+            SERIALIZE_RECORD = _orjson_line
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+        if concurrent:
+            # cProfile can only be active on one thread at a time
+            logger.warning("--profile_dir runs sources sequentially so each gets its own profile.")
+            concurrent = False
+    if daemon and not cache_dir:
+        # Without validators every poll would download and parse every feed again
+        cache_dir = os.path.join(output_dir, ".http_cache")
+    if cache_dir:
+        HTTP_CACHE = HttpCache(cache_dir, max_bytes=cache_max_mb * 1024 * 1024)
+        logger.info(f"Using HTTP cache at {cache_dir} (max {cache_max_mb} MB).")
+
+    os.makedirs(output_dir, exist_ok=True)
+    EXPORTER = None
+    if export_formats:
+        export_dir = export_dir or os.path.join(output_dir, "export")
+        EXPORTER = OutputExporter(export_dir, export_formats)
+        logger.info(f"Exporting {', '.join(EXPORTER.formats) or 'nothing'} partitions under {export_dir}.")
+    if delta:
+        state_dir = state_dir or os.path.join(output_dir, ".state")
+    if link:
+        link_index = link_index or os.path.join(output_dir, ".link_index.db")
 
-                summary = entry.get("summary", "")
-                # Basic HTML stripping (consider BeautifulSoup for complex HTML)
-                # import re 
-                # summary = re.sub('<[^<]+?>', '', summary).strip()
+    def run(only=None):
+        nonlocal resume
+        run_ingest(output_dir, lookback_days, only=only, concurrent=concurrent, max_workers=max_workers,
+                   delta=delta, state_dir=state_dir, store_path=store_path, correlate_cves=correlate_cves,
+                   attack_relationships=attack_relationships, metrics_json=metrics_json,
+                   prometheus_textfile=prometheus_textfile, profile_dir=profile_dir, trace_memory=trace_memory,
+                   backfill=backfill, backfill_workers=backfill_workers, rollup=rollup,
+                   inventory_path=inventory_path, link_index=link_index if link else None,
+                   resume=resume, keep_unpolled_metrics=daemon)
+        resume = False # a daemon resumes an interrupted day on its first poll only
 
-                norm_record = {
-                    "type": alert_type_name, # e.g. "CISA_ALERT", "CISA_ACTIVITY"
-                    "source": "CISA",
-                    "title": title,
-                    "link": link,
-                    "published_date": published_date_iso,
-                    "summary": summary.strip(),
-                }
-                out_f.write(json.dumps(norm_record) + "\\n")
-        logger.info(f"Wrote parsed {alert_type_name} to {output_path}")
-    except Exception as e:
-        logger.error(f"Failed parsing CISA RSS feed {rss_url}: {e}", exc_info=True)
+    if daemon:
+        run_daemon(run, {**SOURCE_POLL_INTERVALS, **(poll_intervals or {})})
+    else:
+        run()
 
 
-def parse_msrc_api(output_path, lookback_days=1):
+def run_ingest(output_dir, lookback_days, only=None, concurrent=False, max_workers=6, delta=False,
+               state_dir=None, store_path=None, correlate_cves=False, attack_relationships=False,
+               metrics_json=None, prometheus_textfile=None, profile_dir=None, trace_memory=False,
+               backfill=None, backfill_workers=None, rollup=False, inventory_path=None,
+               link_index=None, resume=False, keep_unpolled_metrics=False):
     \"\"\"
-    Fetches recent MSRC vulnerabilities and writes a normalized JSONL file.
-    Filters vulnerabilities released in the last 'lookback_days'.
+    One ingest run over the sources named in 'only' (default: all), followed by the store,
+    inventory matching, correlation, alert linking, rollup and metrics stages. Process-wide settings (host limit, cache, exports) are made
+    by main(). With 'resume', sources the day's CHECKPOINT lists as completed are not fetched again.
+    With 'keep_unpolled_metrics', sources not run this time keep their last metrics.
     \"\"\"
-    base_url = "https://api.msrc.microsoft.com/update-guide/v1/vulnerabilities"
-    
-    # Calculate the start date for filtering
-    start_date = datetime.now(timezone.utc) - timedelta(days=lookback_days)
-    start_date_str = start_date.strftime("%Y-%m-%dT%H:%M:%SZ") # MSRC API expects ISO 8601 format
+    global METRICS, ROLLUP, CHECKPOINT
+    previous_metrics = METRICS
+    METRICS = RunMetrics()
+    if trace_memory:
+        tracemalloc.start()
+    today = datetime.utcnow().strftime("%Y%m%d")
+    ROLLUP = DailyRollup(output_dir, today) if rollup and not backfill else None
+    CHECKPOINT = RunCheckpoint(output_dir, today, resume=resume) if not backfill else None
+    logger.info(f"Starting threat intelligence ingestion for {today}. Output directory: {output_dir}")
+    logger.info(f"Data lookback for APIs (like MSRC): {lookback_days} day(s).")
 
-    # OData filter for releaseDate. Using 'gt' (greater than) for recent items.
-    # Or 'ge' (greater than or equal) if precise boundary is needed.
-    # For a daily script, 'gt' the start of 'lookback_days' ago is fine.
-    query_filter = f"$filter=releaseDate gt {start_date_str}"
-    
-    current_url = f"{base_url}?{query_filter}"
-    api_key = os.getenv("MSRC_API_KEY") # Optional: MSRC API may work without a key for public data but is rate-limited.
-    headers = {"Accept": "application/json"}
-    if api_key:
-        headers["api-key"] = api_key
-        logger.info("Using MSRC_API_KEY for MSRC API.")
+    if backfill:
+        # A rebuild run: only the yearly NVD feeds, instead of the daily sources
+        first_year, last_year = backfill
+        sources = [("nvd_backfill", lambda: backfill_nvd(output_dir, today, first_year, last_year,
+                                                         workers=backfill_workers, timeout=SOURCE_TIMEOUTS["nvd"]))]
+        if delta:
+            logger.warning("--delta does not apply to --backfill runs; ignoring it.")
+            delta = False
     else:
-        logger.info("No MSRC_API_KEY found, accessing MSRC API without authentication (may be rate-limited).")
+        sources = build_sources(output_dir, today, lookback_days, attack_relationships=attack_relationships)
+    if only is not None:
+        sources = [(name, job) for name, job in sources if name in only]
+    completed = CHECKPOINT.completed_sources() & {name for name, _ in sources} if resume and CHECKPOINT else set()
+    if completed:
+        logger.info(f"Resuming: {', '.join(sorted(completed))} already completed today; keeping their outputs.")
+    if delta:
+        logger.info(f"Delta mode: emitting new/changed records against state in {state_dir}.")
+        sources = [(name, job if name in completed else _with_delta(name, job, output_dir, today, state_dir))
+                   for name, job in sources]
+    sources = [(name, _keep_completed(name, output_dir, today) if name in completed else job) for name, job in sources]
+    started = time.monotonic()
+    # Outputs kept from the interrupted run still count as this run's for the store
+    started_wall = CHECKPOINT.started if completed else time.time()
+    if concurrent:
+        # Each source runs in its own worker, so one slow or failing feed no longer holds up the rest;
+        # total run time approaches that of the slowest feed.
+        logger.info(f"Running {len(sources)} sources concurrently (workers={max_workers}, per-host limit={MAX_REQUESTS_PER_HOST}).")
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ingest") as pool:
+            futures = {pool.submit(_run_source, name, job): name for name, job in sources}
+            for future in as_completed(futures):
+                future.result()
+    else:
+        for name, job in sources:
+            if trace_memory:
+                tracemalloc.reset_peak() # per-source traced peaks; concurrent runs report the run's peak so far
+            _run_source(name, job, profile_dir=profile_dir)
 
-    all_msrc_vulns = []
-    page_num = 1
+    if store_path:
+        try:
+            with METRICS.timer("store"):
+                update_store(store_path, output_dir, today, started_wall)
+        except Exception as e:
+            logger.error(f"Failed updating store {store_path}: {e}", exc_info=True)
 
-    logger.info(f"Fetching MSRC vulnerabilities released after {start_date_str}")
+    if store_path and inventory_path:
+        since = (datetime.utcnow() - timedelta(days=lookback_days)).strftime("%Y-%m-%d")
+        try:
+            with METRICS.timer("inventory"):
+                write_inventory_matches(store_path, inventory_path, output_dir, today, since=since)
+        except Exception as e:
+            logger.error(f"Failed matching inventory {inventory_path}: {e}", exc_info=True)
 
-    while current_url:
-        logger.info(f"Fetching MSRC page: {page_num} from {current_url.split('?')[0]}...") # Log base URL to avoid logging full query if sensitive
+    if correlate_cves:
         try:
-            # Using requests directly for more control over headers and potential API key
-            resp = requests.get(current_url, headers={**{"User-Agent": DEFAULT_USER_AGENT}, **headers}, timeout=60)
-            resp.raise_for_status()
-            data = resp.json()
-            
-            all_msrc_vulns.extend(data.get("value", []))
-            
-            # MSRC API uses @odata.nextLink for pagination
-            current_url = data.get("@odata.nextLink")
-            page_num += 1
-            if not current_url:
-                logger.info("No more MSRC pages to fetch.")
-                break
-        except requests.RequestException as e:
-            logger.error(f"Error fetching MSRC data from {current_url.split('?')[0]}: {e}")
-            break 
-        except json.JSONDecodeError as e:
-            logger.error(f"Error decoding JSON from MSRC {current_url.split('?')[0]}: {e}")
-            break
+            with METRICS.timer("correlate"):
+                correlate(output_dir, today)
+        except Exception as e:
+            logger.error(f"Failed correlating CVEs: {e}", exc_info=True)
 
+    if link_index and not backfill:
+        try:
+            with METRICS.timer("links"):
+                link_alerts(link_index, output_dir, today)
+        except Exception as e:
+            logger.error(f"Failed linking CISA alerts: {e}", exc_info=True)
 
-    if not all_msrc_vulns:
-        logger.info(f"No MSRC vulnerabilities found for the period after {start_date_str}.")
-        # Create an empty file to signify completion if no data, or just skip.
-        # open(output_path, 'w').close() 
-        return
+    if ROLLUP is not None:
+        try:
+            with METRICS.timer("rollup"):
+                ROLLUP.write()
+        except Exception as e:
+            logger.error(f"Failed writing daily rollup: {e}", exc_info=True)
 
-    try:
-        with open(output_path, "w", encoding="utf-8") as out_f:
-            for vuln in tqdm(all_msrc_vulns, desc="MSRC → JSONL"):
-                cve_number = vuln.get("cveNumber")
-                release_date = vuln.get("releaseDate")
-                name = vuln.get("vulnerabilityName") # This is often the title
-                description = vuln.get("description", {}).get("value","") # Description seems to be in a nested structure for some CVRF versions
-
-                # Extract CVSS - MSRC provides a list, pick the most relevant (e.g., highest base score or specific provider)
-                cvss_info = {}
-                best_cvss = None
-                for cvss_set in vuln.get("cvssScoreSets", []):
-                    if cvss_set.get("baseScore") is not None: # Ensure there's a base score
-                        if best_cvss is None or cvss_set.get("baseScore") > best_cvss.get("baseScore", 0):
-                             # Prefer CVSS v3 if available and provider is Microsoft
-                            if "cvssV3" in cvss_set.get("vector","").lower() or "CVSS:3" in cvss_set.get("vector",""):
-                                best_cvss = cvss_set
-                            elif best_cvss is None: # Fallback if no V3 found yet
-                                best_cvss = cvss_set
-                
-                if best_cvss:
-                    cvss_info = {
-                        "baseScore": best_cvss.get("baseScore"),
-                        "severity": best_cvss.get("severity"), # MSRC CVSS severity might differ from NVD's interpretation
-                        "vectorString": best_cvss.get("vector"),
-                    }
-
-                affected_products_summary = []
-                for prod in vuln.get("affectedProducts", []):
-                    affected_products_summary.append(
-                        f"{prod.get('productFamily', 'Unknown Family')} - {prod.get('productName', 'Unknown Product')}"
-                    )
-                
-                # Consolidate tags/flags
-                exploited_status = vuln.get("exploited", "Unknown") # e.g., "Yes", "No", "Yes - Publicly Disclosed"
-                publicly_disclosed = vuln.get("publiclyDisclosed", "Unknown")
-
-                norm_record = {
-                    "type": "MSRC_BULLETIN",
-                    "source": "Microsoft",
-                    "cve_id": cve_number, # MSRC bulletins are usually tied to a CVE
-                    "title": name,
-                    "description": description.strip(),
-                    "published_date": release_date,
-                    "cvss": cvss_info,
-                    "affected_products": affected_products_summary, # List of strings
-                    "exploited_status": exploited_status,
-                    "publicly_disclosed": publicly_disclosed,
-                    "msrc_url": f"https://msrc.microsoft.com/update-guide/vulnerability/{cve_number}" if cve_number else ""
-                }
-                out_f.write(json.dumps(norm_record) + "\\n")
-        logger.info(f"Wrote parsed MSRC vulnerabilities to {output_path}")
-    except Exception as e:
-        logger.error(f"Failed writing MSRC data to {output_path}: {e}", exc_info=True)
+    logger.info(f"Intel ingestion complete in {time.monotonic() - started:.1f}s.")
+    if keep_unpolled_metrics:
+        METRICS.inherit(previous_metrics)
+    write_run_metrics(metrics_json=metrics_json, prometheus_textfile=prometheus_textfile)
 
 
-def main(output_dir, lookback_days):
-    os.makedirs(output_dir, exist_ok=True)
-    today = datetime.utcnow().strftime("%Y%m%d")
-    logger.info(f"Starting threat intelligence ingestion for {today}. Output directory: {output_dir}")
-    logger.info(f"Data lookback for APIs (like MSRC): {lookback_days} day(s).")
+def _keep_completed(source, output_dir, today):
+    \"\"\"Job for a source an earlier run completed today: its output is only replayed into the sinks.\"\"\"
+    def run():
+        output_path = source_output_path(output_dir, source, today)
+        if os.path.exists(output_path):
+            _output_reused(output_path)
+        else:
+            CHECKPOINT.complete(source) # completed without records (an empty MSRC period)
+    return run
 
-    # 1) Fetch & parse NVD recent CVE feed
-    nvd_url = "https://nvd.nist.gov/feeds/json/cve/1.1/nvdcve-1.1-recent.json.gz"
-    # fetch_url returns parsed JSON directly if is_json=True (default)
-    nvd_data = fetch_url(nvd_url, decompress_gzip=True, is_json=True) 
-    if nvd_data:
-        parse_nvd_json(nvd_data, os.path.join(output_dir, f"cve_nvd_{today}.jsonl"))
-    else:
-        logger.warning("Skipping NVD parsing due to fetch error.")
 
-    # 2) Fetch & parse MITRE ATT&CK Enterprise STIX
-    mitre_enterprise_url = "https://cti-taxii.mitre.org/stix/collections/95ecc380-afe9-11e4-9b6c-751b66dd541e/stix-2.1.zip"
-    # For ZIP files, fetch as raw bytes first
-    mitre_enterprise_bytes = fetch_url(mitre_enterprise_url, is_json=False) 
-    if mitre_enterprise_bytes:
-        parse_mitre_stix(mitre_enterprise_bytes, os.path.join(output_dir, f"attack_enterprise_{today}.jsonl"), "enterprise")
-    else:
-        logger.warning("Skipping MITRE Enterprise parsing due to fetch error.")
+def run_daemon(run, intervals, jitter=POLL_JITTER):
+    \"\"\"
+    Resident mode: calls run(only=[...]) with each source whenever its interval (seconds, scaled by
+    a random factor within +/- 'jitter') has elapsed, starting with all of them. The process keeps
+    the pooled session and HTTP cache warm between polls. SIGUSR1 re-polls every source at once;
+    SIGTERM or SIGINT stops after the current poll.
+    \"\"\"
+    wake = threading.Event()
+    repoll = threading.Event()
+    stopping = threading.Event()
+
+    def on_repoll(signum, frame):
+        repoll.set()
+        wake.set()
+
+    def on_stop(signum, frame):
+        stopping.set()
+        wake.set()
+
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, on_repoll)
+    signal.signal(signal.SIGTERM, on_stop)
+    signal.signal(signal.SIGINT, on_stop)
+
+    logger.info("Daemon mode: " + ", ".join(f"{name} every {seconds:g}s" for name, seconds in intervals.items()))
+    next_due = {name: time.monotonic() for name in intervals}
+    while not stopping.is_set():
+        if repoll.is_set():
+            repoll.clear()
+            logger.info("Re-poll requested; polling all sources now.")
+            due = list(intervals)
+        else:
+            now = time.monotonic()
+            due = [name for name, at in next_due.items() if at <= now]
+        if due:
+            run(only=due)
+            for name in due:
+                next_due[name] = time.monotonic() + intervals[name] * random.uniform(1 - jitter, 1 + jitter)
+            continue
+        wake.clear()
+        wake.wait(timeout=max(0.0, min(next_due.values()) - time.monotonic()))
+    logger.info("Daemon stopped.")
 
-    # 3) Fetch & parse MITRE ATT&CK ICS STIX
-    mitre_ics_url = "https://cti-taxii.mitre.org/stix/collections/02c3ef24-9cd4-48f3-a99f-679424e34d7e/stix-2.1.zip"
-    mitre_ics_bytes = fetch_url(mitre_ics_url, is_json=False)
-    if mitre_ics_bytes:
-        parse_mitre_stix(mitre_ics_bytes, os.path.join(output_dir, f"attack_ics_{today}.jsonl"), "ics")
-    else:
-        logger.warning("Skipping MITRE ICS parsing due to fetch error.")
-        
-    # 4) Fetch & parse CISA Alerts RSS
-    cisa_alerts_url = "https://www.cisa.gov/uscert/ncas/alerts.xml"
-    parse_cisa_rss(cisa_alerts_url, os.path.join(output_dir, f"cisa_alerts_{today}.jsonl"), "CISA_ALERT")
-    
-    # 5) Fetch & parse CISA Current Activity RSS
-    cisa_activity_url = "https://www.cisa.gov/uscert/ncas/current-activity.xml"
-    parse_cisa_rss(cisa_activity_url, os.path.join(output_dir, f"cisa_activity_{today}.jsonl"), "CISA_ACTIVITY")
 
-    # 6) Fetch & parse MSRC API Bulletins
-    parse_msrc_api(os.path.join(output_dir, f"msrc_bulletins_{today}.jsonl"), lookback_days=lookback_days)
+def parse_year_range(value):
+    \"\"\"argparse type for --backfill: "2002-2024" or a single year, as (first, last).\"\"\"
+    first, _, last = value.partition("-")
+    try:
+        first, last = int(first), int(last or first)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YEAR or FIRST-LAST, got {value!r}")
+    if not NVD_FIRST_YEAR <= first <= last <= datetime.utcnow().year:
+        raise argparse.ArgumentTypeError(f"year range must lie within {NVD_FIRST_YEAR}-{datetime.utcnow().year}")
+    return first, last
+
+
+def parse_poll_interval(value):
+    \"\"\"argparse type for --poll_interval: SOURCE=SECONDS, as (source, seconds).\"\"\"
+    source, _, seconds = value.partition("=")
+    if source not in SOURCE_POLL_INTERVALS:
+        raise argparse.ArgumentTypeError(f"unknown source {source!r}; expected one of {', '.join(SOURCE_POLL_INTERVALS)}")
+    try:
+        seconds = float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected SOURCE=SECONDS, got {value!r}")
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError("poll interval must be positive")
+    return source, seconds
 
-    logger.info("Intel ingestion complete.")
+
+def write_run_metrics(metrics_json=None, prometheus_textfile=None, top_allocations=20):
+    \"\"\"Finishes METRICS for the run: logs per-source stage times and writes the requested reports.\"\"\"
+    METRICS.finished = time.time()
+    if tracemalloc.is_tracing():
+        stats = tracemalloc.take_snapshot().statistics("lineno")[:top_allocations]
+        METRICS.tracemalloc_top = [{"location": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+                                   for stat in stats]
+        peak = max([tracemalloc.get_traced_memory()[1]] +
+                   [entry.get("traced_peak_bytes", 0) for entry in METRICS.sources.values()])
+        logger.info(f"Traced memory peak: {peak / 1e6:.1f} MB")
+        tracemalloc.stop()
+    METRICS.log_summary()
+    for path, write in ((metrics_json, METRICS.write_json), (prometheus_textfile, METRICS.write_prometheus)):
+        if not path:
+            continue
+        try:
+            write(path)
+            logger.info(f"Wrote run metrics to {path}")
+        except OSError as e:
+            logger.error(f"Failed writing run metrics to {path}: {e}")
 
 
 if __name__ == "__main__":
@@ -460,7 +3616,166 @@ if __name__ == "__main__":
         default=1,
         help="Number of days to look back for date-filterable APIs like MSRC (default: 1 day)."
     )
+    p.add_argument(
+        "--concurrent",
+        action="store_true",
+        help="Fetch and parse all sources in parallel instead of one after another.",
+    )
+    p.add_argument(
+        "--max_workers",
+        type=int,
+        default=6,
+        help="Number of sources processed at once in --concurrent mode (default: 6).",
+    )
+    p.add_argument(
+        "--max_per_host",
+        type=int,
+        default=2,
+        help="Maximum simultaneous requests to a single feed host (default: 2).",
+    )
+    p.add_argument(
+        "--cache_dir",
+        help="Directory for a persistent HTTP cache. Feeds are revalidated with conditional GETs and "
+             "unchanged ones reuse the previous normalized output.",
+    )
+    p.add_argument(
+        "--cache_max_mb",
+        type=int,
+        default=512,
+        help="Size limit of the HTTP cache; least recently used responses are evicted beyond it (default: 512).",
+    )
+    p.add_argument(
+        "--delta",
+        action="store_true",
+        help="Also write <prefix>_delta_YYYYMMDD.jsonl with only new or changed records, and tombstone "
+             "files for ATT&CK techniques that were removed.",
+    )
+    p.add_argument(
+        "--state_dir",
+        help="Where --delta keeps per-record state between runs (default: <output_dir>/.state).",
+    )
+    p.add_argument(
+        "--store",
+        help="SQLite database to upsert this run's records into, with per-type indexes and full-text search "
+             "for serving paginated queries (see IntelStore.query).",
+    )
+    p.add_argument(
+        "--inventory",
+        help="File of owned products (CPE 2.3 names, vendor:product pairs or product names, one per line). "
+             "With --store, writes inventory_matches_YYYYMMDD.json with the CVEs published within "
+             "--lookback_days that affect each of them.",
+    )
+    p.add_argument(
+        "--correlate",
+        action="store_true",
+        help="After ingest, join NVD/MSRC/CISA on CVE ID and write cve_index_YYYYMMDD.json and the day's "
+             "exploit chains to chains_YYYYMMDD.json.",
+    )
+    p.add_argument(
+        "--orjson",
+        action="store_true",
+        help="Serialize records with orjson (if installed). Faster, but lines are compact and keep non-ASCII "
+             "text unescaped, so they differ byte-wise from the default output (and from --delta state built "
+             "without it).",
+    )
+    p.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted run of the same day from its checkpoint (<output_dir>/.checkpoint_YYYYMMDD.json): "
+             "sources already completed are not fetched again and MSRC pagination continues from the last "
+             "written page. Ignored with --backfill.",
+    )
+    p.add_argument(
+        "--link_alerts",
+        action="store_true",
+        help="After ingest, rank the ATT&CK techniques and CVEs most similar in text to each CISA alert and "
+             "activity item and write them to alert_links_YYYYMMDD.jsonl.",
+    )
+    p.add_argument(
+        "--link_index",
+        help="SQLite similarity index kept across runs for --link_alerts (default: <output_dir>/.link_index.db).",
+    )
+    p.add_argument(
+        "--rollup",
+        action="store_true",
+        help="Keep daily aggregates while records are written (CVE counts by severity and CVSS version, "
+             "MSRC exploited/disclosed counts, top CVEs, ATT&CK techniques per tactic and platform, latest "
+             "CISA items) and save them as rollup_YYYYMMDD.json.",
+    )
+    p.add_argument(
+        "--attack_relationships",
+        action="store_true",
+        help="While parsing ATT&CK, also write attack_<framework>_relationships_YYYYMMDD.jsonl with the "
+             "mitigations, groups and software linked to each technique.",
+    )
+    p.add_argument(
+        "--export",
+        action="append",
+        choices=EXPORT_FORMATS,
+        help="Also write each source's records as gzip/zstd JSONL or typed Parquet columns, partitioned as "
+             "<export_dir>/<format>/source=<source>/date=<YYYY-MM-DD>/. Repeat for several formats; jsonl.zst needs "
+             "zstandard, parquet needs pyarrow.",
+    )
+    p.add_argument(
+        "--export_dir",
+        help="Root of the --export partitions (default: <output_dir>/export).",
+    )
+    p.add_argument(
+        "--backfill",
+        type=parse_year_range,
+        metavar="FIRST-LAST",
+        help="Rebuild the NVD corpus from the yearly feeds of these years (e.g. 2002-2024) into "
+             "cve_nvd_backfill_YYYYMMDD.jsonl, deduplicated by CVE ID, instead of running the daily sources.",
+    )
+    p.add_argument(
+        "--backfill_workers",
+        type=int,
+        help="Processes normalizing yearly feeds in --backfill mode (default: one per CPU core).",
+    )
+    p.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Stay resident and poll each source on its own interval (see SOURCE_POLL_INTERVALS) with "
+             "jitter, reusing connections and the HTTP cache (default: <output_dir>/.http_cache). "
+             "Send SIGUSR1 to re-poll all sources immediately.",
+    )
+    p.add_argument(
+        "--poll_interval",
+        type=parse_poll_interval,
+        action="append",
+        metavar="SOURCE=SECONDS",
+        help="Override a source's --daemon poll interval, e.g. cisa_activity=1800. Repeatable.",
+    )
+    p.add_argument(
+        "--metrics_json",
+        help="Write per-source, per-stage run metrics (time, bytes, records, HTTP statuses, peak memory) "
+             "as JSON to this path at the end of the run.",
+    )
+    p.add_argument(
+        "--prometheus_textfile",
+        help="Write the run metrics in Prometheus text format to this path, e.g. into node_exporter's "
+             "textfile collector directory.",
+    )
+    p.add_argument(
+        "--profile_dir",
+        help="Profile each source with cProfile and save <source>.prof files here (implies sequential runs).",
+    )
+    p.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="Trace Python allocations; the traced peak per source and the top allocation sites are "
+             "added to the run metrics.",
+    )
+    p.add_argument(
+        "--no_progress",
+        action="store_true",
+        help="Disable the tqdm progress bars (e.g. when running unattended).",
+    )
     args = p.parse_args()
+    if args.daemon and args.backfill:
+        p.error("--backfill is a one-off rebuild and cannot run with --daemon")
+    if args.inventory and not args.store:
+        p.error("--inventory matches against the product index in --store")
     
     # Configure file handler for logging if needed
     # log_file_path = os.path.join(args.output_dir, f"intel_ingest_{datetime.utcnow().strftime('%Y%m%d')}.log")
@@ -469,6 +3784,17 @@ if __name__ == "__main__":
     # fh.setFormatter(formatter)
     # logger.addHandler(fh)
     
-    main(args.output_dir, args.lookback_days)
+    main(args.output_dir, args.lookback_days, concurrent=args.concurrent,
+         max_workers=args.max_workers, max_per_host=args.max_per_host,
+         cache_dir=args.cache_dir, cache_max_mb=args.cache_max_mb,
+         delta=args.delta, state_dir=args.state_dir, store_path=args.store,
+         correlate_cves=args.correlate, attack_relationships=args.attack_relationships,
+         metrics_json=args.metrics_json, prometheus_textfile=args.prometheus_textfile,
+         profile_dir=args.profile_dir, trace_memory=args.tracemalloc, progress=not args.no_progress,
+         export_formats=args.export, export_dir=args.export_dir,
+         backfill=args.backfill, backfill_workers=args.backfill_workers,
+         daemon=args.daemon, poll_intervals=dict(args.poll_interval or []), rollup=args.rollup,
+         inventory_path=args.inventory, link=args.link_alerts, link_index=args.link_index,
+         resume=args.resume, use_orjson=args.orjson)
 """
 }
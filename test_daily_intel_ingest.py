@@ -0,0 +1,349 @@
+"""
+Tests for daily_intel_ingest.py, loaded from its manifest the way bench_intel_ingest does.
+Golden tests for record serialization: the parse_* writers of the script before the batched
+RecordWriter (git BASELINE_COMMIT) and of this one run on the same synthetic feeds of bench_intel_ingest,
+and the lines must match byte for byte (after json.loads for the --orjson path).
+
+  python3 -m pytest -q test_daily_intel_ingest.py
+"""
+
+import io
+import os
+import json
+import gzip
+import types
+import zipfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+import bench_intel_ingest as bench
+
+ingest = bench.load_ingest(bench.DEFAULT_SCRIPT)
+
+BASELINE_COMMIT = "791f449"
+BASELINE_MSRC_URL = "https://api.msrc.microsoft.com/update-guide/v1/vulnerabilities" # hard-coded in the baseline
+# Text json.dumps escapes (ensure_ascii) and orjson writes as UTF-8
+NON_ASCII = "Überlauf im Treiber – „crafted“ request 🙂 \x07\u2028"
+SOURCES = ("nvd", "attack", "cisa", "msrc")
+
+
+def _nvd_records():
+    items = json.loads(gzip.decompress(bench.generate_nvd_gz(40, seed=1)))["CVE_Items"]
+    items[0]["cve"]["description"]["description_data"][0]["value"] = NON_ASCII
+    return [ingest.normalize_nvd_item(item) for item in items]
+
+
+def _nvd_gz():
+    data = json.loads(gzip.decompress(bench.generate_nvd_gz(40, seed=1)))
+    data["CVE_Items"][0]["cve"]["description"]["description_data"][0]["value"] = NON_ASCII
+    return gzip.compress(json.dumps(data).encode("utf-8"))
+
+
+def _stix_zip():
+    with zipfile.ZipFile(io.BytesIO(bench.generate_stix_zip(20, seed=1))) as z:
+        bundle = json.loads(z.read("enterprise-attack.json"))
+    next(obj for obj in bundle["objects"] if obj["type"] == "attack-pattern")["description"] = NON_ASCII
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("enterprise-attack.json", json.dumps(bundle))
+    return buf.getvalue()
+
+
+def _msrc_page(page, n_pages, per_page, base_url, seed=0, generate_msrc_page=bench.generate_msrc_page):
+    data = json.loads(generate_msrc_page(page, n_pages, per_page, base_url, seed))
+    if page == 0:
+        data["value"][0]["vulnerabilityName"] = NON_ASCII
+    return json.dumps(data).encode("utf-8")
+
+
+@pytest.fixture(scope="module")
+def feeds(tmp_path_factory):
+    """Local feed server and STIX zip both scripts read; yields (urls, stix_path)."""
+    stix = _stix_zip()
+    stix_path = tmp_path_factory.mktemp("feeds") / "enterprise-attack.zip"
+    stix_path.write_bytes(stix)
+    # No control characters in XML
+    cisa = bench.generate_cisa_rss(20, seed=1).replace(b"CISA alerts 0:", f"CISA alerts 0: {NON_ASCII[:-2]}".encode("utf-8"))
+    payloads = {"/nvd/nvdcve-1.1-recent.json.gz": _nvd_gz(), "/mitre/enterprise.zip": stix, "/cisa/alerts.xml": cisa}
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(bench, "generate_msrc_page", _msrc_page)
+        with bench.FeedServer(payloads, msrc_pages=2, msrc_per_page=10, seed=1) as server:
+            yield server.urls(), stix_path
+
+
+@pytest.fixture(scope="module")
+def baseline(feeds, tmp_path_factory):
+    """Output of the baseline script's parse_* writers, by source."""
+    urls, stix_path = feeds
+    out_dir = tmp_path_factory.mktemp("baseline")
+    try:
+        script = subprocess.run(["git", "show", f"{BASELINE_COMMIT}:daily_intel_ingest.py"], capture_output=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(bench.__file__))).stdout
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip(f"baseline commit {BASELINE_COMMIT} is not available")
+    (out_dir / "daily_intel_ingest.py").write_bytes(script)
+    base = bench.load_ingest(str(out_dir / "daily_intel_ingest.py"))
+
+    def get(url, *args, **kwargs):
+        return requests.get(url.replace(BASELINE_MSRC_URL, urls["MSRC_API_URL"]), *args, **kwargs)
+
+    base.requests = types.SimpleNamespace(get=get, RequestException=requests.RequestException)
+    base.parse_nvd_json(base.fetch_url(urls["NVD_RECENT_URL"], decompress_gzip=True), str(out_dir / "nvd.jsonl"))
+    base.parse_mitre_stix(stix_path.read_bytes(), str(out_dir / "attack.jsonl"), "enterprise")
+    base.parse_cisa_rss(urls["CISA_ALERTS_URL"], str(out_dir / "cisa.jsonl"), "CISA_ALERT")
+    base.parse_msrc_api(str(out_dir / "msrc.jsonl"), lookback_days=1)
+    outputs = {source: (out_dir / f"{source}.jsonl").read_text(encoding="utf-8") for source in SOURCES}
+    for source, text in outputs.items():
+        first = json.loads(text.split("\n", 1)[0])
+        assert any(NON_ASCII[:-2] in str(value) for value in first.values()), source
+    return outputs
+
+
+def _parse(source, feeds, path, monkeypatch):
+    """Runs this script's parse_* writer for 'source' and returns its output."""
+    urls, stix_path = feeds
+    for name, url in urls.items():
+        monkeypatch.setattr(ingest, name, url)
+    monkeypatch.setattr(ingest, "SHOW_PROGRESS", False)
+    monkeypatch.setattr(ingest, "HTTP_CACHE", None)
+    monkeypatch.setattr(ingest, "WRITE_BATCH_RECORDS", 7) # several batches and a short last one
+    if source == "nvd":
+        ingest.parse_nvd_json(ingest.fetch_json_items(urls["NVD_RECENT_URL"], "CVE_Items", decompress_gzip=True), str(path))
+    elif source == "attack":
+        ingest.parse_mitre_stix(str(stix_path), str(path), "enterprise")
+    elif source == "cisa":
+        ingest.parse_cisa_rss(urls["CISA_ALERTS_URL"], str(path), "CISA_ALERT")
+    else:
+        ingest.parse_msrc_api(str(path), lookback_days=1)
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _baseline_line(source, line, new_record):
+    # NVD records gained "cpes" after the baseline; it is appended as the last member
+    if source == "nvd":
+        return line[:-1] + ', "cpes": ' + json.dumps(new_record["cpes"]) + "}"
+    return line
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_writers_match_baseline(source, feeds, baseline, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "SERIALIZE_RECORD", ingest._json_line)
+    lines = _parse(source, feeds, tmp_path / "records.jsonl", monkeypatch).split("\n")
+    assert lines.pop() == ""
+    expected = baseline[source].split("\n")
+    assert expected.pop() == ""
+    assert len(lines) == len(expected) > 1
+    for line, base_line in zip(lines, expected):
+        assert line == _baseline_line(source, base_line, json.loads(line))
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_orjson_writers_match_baseline(source, feeds, baseline, tmp_path, monkeypatch):
+    if ingest.orjson is None:
+        pytest.skip("orjson is not installed")
+    monkeypatch.setattr(ingest, "SERIALIZE_RECORD", ingest._orjson_line)
+    # Only "\n" ends a JSONL line; orjson leaves other line breaks such as U+2028 unescaped
+    lines = _parse(source, feeds, tmp_path / "records.jsonl", monkeypatch).split("\n")
+    assert lines.pop() == ""
+    expected = baseline[source].split("\n")
+    assert expected.pop() == ""
+    assert len(lines) == len(expected) > 1
+    for line, base_line in zip(lines, expected):
+        record = json.loads(line)
+        assert record == json.loads(_baseline_line(source, base_line, record))
+
+
+def _cve(cve_id, cvss, exploited=False, publicly_disclosed=False, cisa_mentions=0):
+    item = {"cve_id": cve_id, "mentions": [], "cvss": cvss, "exploited": exploited,
+            "publicly_disclosed": publicly_disclosed, "cisa_mentions": cisa_mentions}
+    item["risk"] = round(ingest._cve_risk(item), 4)
+    return item
+
+
+def _severity(risk_score):
+    # getRiskSeverityLabel in components/chains/ChainCard.tsx
+    return "CRITICAL" if risk_score >= 3 else "HIGH" if risk_score >= 2 else "MEDIUM" if risk_score >= 1 else "LOW"
+
+
+def test_chain_risk_follows_riskiest_cve_not_chain_size():
+    cluster = [_cve(f"CVE-2024-{1000 + i}", 7.5) for i in range(8)]
+    lone = _cve("CVE-2024-9999", 9.8, exploited=True, publicly_disclosed=True, cisa_mentions=1)
+    index = {item["cve_id"]: item for item in cluster + [lone]}
+    # NVD references link the cluster into one path of 8 CVEs
+    links = [([a["cve_id"], b["cve_id"]], f"NVD {a['cve_id']}") for a, b in zip(cluster, cluster[1:])]
+
+    chains = ingest.build_exploit_chains(index, links)
+
+    assert [len(chain["cve_ids"]) for chain in chains] == [1, 8]
+    lone_chain, cluster_chain = chains
+    assert lone_chain["cve_ids"] == ["CVE-2024-9999"]
+    assert _severity(lone_chain["risk_score"]) == "CRITICAL"
+    assert cluster_chain["depth"] == 8
+    assert _severity(cluster_chain["risk_score"]) == "MEDIUM"
+    # Depth still counts, within its cap
+    assert cluster_chain["risk_score"] > ingest.CHAIN_RISK_SCALE * cluster[0]["risk"]
+
+
+class _NotFound(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_failed_feeds_report_sources_failed(tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _NotFound)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    for name in ("NVD_RECENT_URL", "MITRE_ENTERPRISE_URL", "MITRE_ICS_URL", "CISA_ALERTS_URL",
+                 "CISA_ACTIVITY_URL", "MSRC_API_URL"):
+        monkeypatch.setattr(ingest, name, f"{base}/{name.lower()}")
+    try:
+        ingest.main(str(tmp_path / "out"), 1, progress=False, metrics_json=str(tmp_path / "run.json"),
+                    prometheus_textfile=str(tmp_path / "intel.prom"))
+    finally:
+        server.shutdown()
+
+    sources = json.loads((tmp_path / "run.json").read_text())["sources"]
+    expected = {"nvd", "mitre_enterprise", "mitre_ics", "cisa_alerts", "cisa_activity", "msrc"}
+    assert {name for name, entry in sources.items() if "ok" in entry} == expected
+    for name in expected:
+        assert sources[name]["ok"] is False and sources[name]["errors"] >= 1, name
+    prom = (tmp_path / "intel.prom").read_text()
+    for name in expected:
+        assert f'intel_ingest_source_success{{source="{name}"}} 0' in prom
+
+
+def test_store_reload_leaves_unchanged_records_and_products(tmp_path):
+    records = _nvd_records()
+    path = tmp_path / "nvd.jsonl"
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    store = ingest.IntelStore(str(tmp_path / "store.db"))
+    try:
+        store.load_jsonl("nvd", str(path))
+        products = store.conn.execute("SELECT * FROM product_cves ORDER BY 1, 2, 3, 4").fetchall()
+        assert products
+
+        changes = store.conn.total_changes
+        store.load_jsonl("nvd", str(path))
+        assert store.conn.total_changes == changes
+
+        # A changed record replaces its own product rows only
+        changed = records[1]
+        changed["cpes"] = ["cpe:2.3:a:example:widget:1.0:*:*:*:*:*:*:*"]
+        path.write_text("".join(json.dumps(record) + "\n" for record in records))
+        store.load_jsonl("nvd", str(path))
+        rows = store.conn.execute("SELECT vendor, product, versions FROM product_cves WHERE cve_id = ?",
+                                  [changed["cve_id"]]).fetchall()
+        assert rows == [("example", "widget", "1.0")]
+        others = store.conn.execute("SELECT * FROM product_cves WHERE cve_id != ? ORDER BY 1, 2, 3, 4",
+                                    [changed["cve_id"]]).fetchall()
+        assert others == [row for row in products if row[2] != changed["cve_id"]]
+    finally:
+        store.close()
+
+
+def _load_store(tmp_path, source, records):
+    path = tmp_path / f"{source}.jsonl"
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    store = ingest.IntelStore(str(tmp_path / "store.db"))
+    store.load_jsonl(source, str(path))
+    return store
+
+
+def _search_all(store, endpoint, q, size=7):
+    items, page = [], 1
+    while True:
+        result = store.query(endpoint, page, size, q=q)
+        items += result["items"]
+        if page >= result["totalPages"]:
+            return result["totalItems"], items
+        page += 1
+
+
+def _matches(record, q):
+    text = " ".join(str(value) for value in record.values()).lower()
+    return all(term in text for term in q.lower().split())
+
+
+def test_search_pages_newest_first(tmp_path):
+    items = json.loads(gzip.decompress(bench.generate_nvd_gz(300, seed=1)))["CVE_Items"]
+    records = [ingest.normalize_nvd_item(item) for item in items]
+    store = _load_store(tmp_path, "nvd", records)
+    try:
+        for q in ("remote", "heap overflow", records[17]["cve_id"]):
+            total, found = _search_all(store, "/nvd", q)
+            expected = {record["cve_id"] for record in records if _matches(record, q)}
+            assert expected and total == len(found) == len(expected), q
+            assert {record["cve_id"] for record in found} == expected
+            dates = [record["published_date"] for record in found]
+            assert dates == sorted(dates, reverse=True)
+
+        # A record whose published_date changes moves to its new place
+        moved = records[-1]
+        moved["published_date"] = "2099-01-01T00:00Z"
+        (tmp_path / "nvd.jsonl").write_text("".join(json.dumps(record) + "\n" for record in records))
+        store.load_jsonl("nvd", str(tmp_path / "nvd.jsonl"))
+        assert store.query("/nvd", 1, 1, q=moved["cve_id"].split("-")[0])["items"] == [moved]
+        assert store.query("/nvd", 1, 1)["items"] == [moved]
+    finally:
+        store.close()
+
+
+def test_search_counts_at_most_max_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "STORE_SEARCH_MAX_RESULTS", 10)
+    store = _load_store(tmp_path, "nvd", _nvd_records())
+    try:
+        total, found = _search_all(store, "/nvd", "cve", size=4)
+        assert total == len(found) == 10
+        assert store.query("/nvd", 4, 4, q="cve")["items"] == []
+        # Listing without a search is not capped
+        assert store.query("/nvd", 1, 4)["totalItems"] == 40
+    finally:
+        store.close()
+
+
+def test_search_filters_cisa_type(tmp_path):
+    feed = ingest.feedparser.parse(bench.generate_cisa_rss(30, seed=1))
+    records = [ingest.normalize_cisa_entry(entry, "CISA_ALERT" if i % 3 else "CISA_ACTIVITY")
+               for i, entry in enumerate(feed.entries)]
+    store = _load_store(tmp_path, "cisa_alerts", records)
+    try:
+        for endpoint, kind in (("/cisa/alerts", "CISA_ALERT"), ("/cisa/activity", "CISA_ACTIVITY")):
+            total, found = _search_all(store, endpoint, "attacker", size=4)
+            expected = [record for record in records if record["type"] == kind and _matches(record, "attacker")]
+            assert expected and total == len(found) == len(expected)
+            assert sorted(record["link"] for record in found) == sorted(record["link"] for record in expected)
+            dates = [record["published_date"] for record in found]
+            assert dates == sorted(dates, reverse=True)
+    finally:
+        store.close()
+
+
+def test_delta_sends_keyless_records_once(tmp_path):
+    keyed = {"type": "ATT&CK", "technique_id": "T1000", "name": "Keyed", "modified_date": "2024-01-01"}
+    keyless = {"type": "ATT&CK", "technique_id": "", "name": "Keyless", "modified_date": "2024-01-01"}
+    state_dir = str(tmp_path / "state")
+
+    def run(today, records):
+        snapshot = ingest.source_output_path(str(tmp_path), "mitre_enterprise", today)
+        with open(snapshot, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+        ingest.write_delta("mitre_enterprise", snapshot, str(tmp_path), today, state_dir)
+        with open(ingest.source_output_path(str(tmp_path), "mitre_enterprise", today, "delta"), encoding="utf-8") as f:
+            delta = [json.loads(line) for line in f]
+        with open(ingest.source_output_path(str(tmp_path), "mitre_enterprise", today, "tombstones"), encoding="utf-8") as f:
+            tombstones = [json.loads(line) for line in f]
+        return delta, tombstones
+
+    assert run("20240101", [keyed, keyless]) == ([keyed, keyless], [])
+    assert run("20240102", [keyed, keyless]) == ([], [])
+    # A changed keyless record is a new record; the old one is not tombstoned, as it has no key to name
+    changed = {**keyless, "name": "Keyless, renamed"}
+    assert run("20240103", [keyed, changed]) == ([changed], [])